@@ -5,10 +5,22 @@ import os
 import logging
 import sys
 import threading
+import queue
+from collections import namedtuple
+
+# A line read off the serial port, already classified by the reader thread:
+#   kind: 'doorbell' | 'unlock_echo' | 'signal' | 'unlock' | 'other', or
+#         'give_up' once reconnecting failed for 10 minutes (see connect())
+#   code: the hex code of a 'call:' / 'Received HEX:' line, else None
+#   received: time.time() when the line arrived — events are stamped with it,
+#             and a session reports its bell->start latency against it
+Command = namedtuple('Command', 'line kind code received')
+
 
 class ArduinoHandler:
     def __init__(self, port='/dev/ttyUSB0', baudrate=9600, retry_delay=5, event_logger=None,
-                 ignored_codes=None):
+                 ignored_codes=None, doorbell_codes=None, unlock_echo_codes=None,
+                 queue_size=256, connect_async=False):
         logging.basicConfig(stream=sys.stdout, level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
         config = self.load_config()
@@ -25,12 +37,26 @@ class ArduinoHandler:
         self.event_logger = event_logger
         # Codes that are periodic bus noise — not logged at all.
         self.ignored_codes = set(ignored_codes or [])
+        self.doorbell_codes = set(doorbell_codes or [])
+        self.unlock_echo_codes = set(unlock_echo_codes or [])
+        # Lines are pushed here by the reader thread the moment they arrive, so the
+        # main loop wakes immediately instead of polling once a second.
+        self.commands = queue.Queue(maxsize=queue_size)
         self._lock = threading.Lock()
         self._last_activity = time.time()
         self._reconnecting = False
         self._disconnected_since = None
-        self.connect()
+        self.gave_up = False
+        # Set while a port is open. With connect_async the port is opened on a
+        # background thread (connect() sleeps 2 s for the Arduino's reset and
+        # retries forever); the reader and unlock() already cope with no port.
+        self.connected = threading.Event()
+        if connect_async:
+            threading.Thread(target=self.connect, name='arduino-connect', daemon=True).start()
+        else:
+            self.connect()
         self._start_watchdog()
+        self._start_reader()
 
     def load_config(self, file_path='/data/options.json'):
         if not os.path.exists(file_path):
@@ -45,8 +71,11 @@ class ArduinoHandler:
 
     def connect(self):
         """Attempt to connect to the Arduino, retrying indefinitely.
-        If called after a disconnect and no connection after 10 minutes, exits
-        the process so the HA supervisor restarts the add-on cleanly."""
+        If called after a disconnect and no connection after 10 minutes, gives
+        up: get_command() then returns a 'give_up' Command, on which the main
+        loop exits the process so the HA supervisor restarts the add-on
+        cleanly. (connect() runs on the reader / watchdog / job threads, where
+        sys.exit would only end that thread.)"""
         attempt = 0
         while True:
             # Hard restart after 10 minutes of failed reconnection attempts.
@@ -54,7 +83,9 @@ class ArduinoHandler:
                 disconnected_since = self._disconnected_since
             if disconnected_since is not None and time.time() - disconnected_since > 600:
                 logging.error("Could not reconnect to Arduino after 10 minutes. Triggering add-on restart...")
-                sys.exit(1)
+                self.gave_up = True
+                self._enqueue(Command('', 'give_up', None, time.time()))
+                return
 
             try:
                 ser = serial.Serial(self.port, self.baudrate, timeout=1)
@@ -63,6 +94,7 @@ class ArduinoHandler:
                     self.ser = ser
                     self._last_activity = time.time()
                     self._disconnected_since = None
+                self.connected.set()
                 logging.info(f"Connected to Arduino on {self.port}")
                 if self.event_logger is not None:
                     self.event_logger.log('arduino_connected', port=self.port)
@@ -104,29 +136,108 @@ class ArduinoHandler:
                 return line[len(prefix):].strip()
         return None
 
-    def read_command(self):
+    def _classify(self, line):
+        """Turn a raw line into a Command, or None if it's bus noise to drop."""
+        c = self._code(line)
+        # Drop short (<=4 hex digit) codes entirely — they're bus heartbeat
+        # / noise (2480, 1180, 3080, 2400, ...). No log, no return.
+        if c is not None and len(c) <= 4:
+            return None
+        if c is not None and c in self.ignored_codes:
+            return None
+        if c is not None:
+            if c in self.doorbell_codes:
+                kind = 'doorbell'
+            elif c in self.unlock_echo_codes:
+                kind = 'unlock_echo'
+            else:
+                kind = 'signal'
+        elif line.lower() == "unlock":
+            kind = 'unlock'
+        else:
+            kind = 'other'
+        return Command(line, kind, c, time.time())
+
+    def _start_reader(self):
+        t = threading.Thread(target=self._reader, daemon=True)
+        t.start()
+
+    def _reader(self):
+        """Blocking reader: readline() returns as soon as a newline arrives, so a
+        doorbell line reaches the queue within milliseconds. Every line is read —
+        bursts of bus traffic are drained as fast as they come in."""
+        partial = b""
+        while True:
+            try:
+                partial = self._read_line(partial)
+            except Exception as e:
+                # Nothing may end this thread: it's the only one reading the port.
+                logging.error(f"Serial reader error: {e}")
+                partial = b""
+                time.sleep(1)
+
+    def _read_line(self, partial):
+        """One readline() into the queue; returns the unterminated fragment."""
         with self._lock:
             ser = self.ser
         if ser is None or not ser.is_open:
-            return ""
+            time.sleep(0.2)
+            return b""
         try:
-            if ser.in_waiting > 0:
-                line = ser.readline().decode('utf-8').strip()
-                self._last_activity = time.time()
-                # Drop short (<=4 hex digit) codes entirely — they're bus heartbeat
-                # / noise (2480, 1180, 3080, 2400, ...). No log, no return.
-                c = self._code(line)
-                if c is not None and len(c) <= 4:
-                    return ""
-                if c is not None and c in self.ignored_codes:
-                    return ""
-                # Logging of signal lines is owned by main.py now, so it can attach
-                # a live snapshot to non-doorbell signals before logging them.
-                return line
-        except (serial.SerialException, OSError) as e:
+            raw = ser.readline()  # port timeout=1 bounds the wait
+        except (serial.SerialException, OSError, TypeError) as e:
+            # TypeError: pyserial can raise it when the port is closed under us
+            # by a concurrent reconnect.
             logging.error(f"Error reading from serial: {e}")
-            self.reconnect()
-        return ""
+            if not self.gave_up:
+                self.reconnect()
+            return b""
+        if not raw:
+            return partial
+        self._last_activity = time.time()
+        if not raw.endswith(b"\n"):
+            # readline() timed out mid-line — keep the fragment for the next read.
+            return partial + raw
+        line = (partial + raw).decode('utf-8', errors='replace').strip()
+        if not line:
+            return b""
+        # Logging of signal lines is owned by main.py, so it can attach a live
+        # snapshot to non-doorbell signals before logging them.
+        cmd = self._classify(line)
+        if cmd is not None:
+            self._enqueue(cmd)
+        return b""
+
+    def _enqueue(self, cmd):
+        try:
+            self.commands.put_nowait(cmd)
+        except queue.Full:
+            # Consumer fell far behind — drop the oldest line, never the newest
+            # (a fresh doorbell matters more than stale bus chatter).
+            try:
+                dropped = self.commands.get_nowait()
+                logging.warning(f"Serial queue full, dropped: {dropped.line}")
+            except queue.Empty:
+                pass
+            try:
+                self.commands.put_nowait(cmd)
+            except queue.Full:
+                pass
+
+    def get_command(self, timeout=None):
+        """Block until the next classified Command arrives (or timeout → None).
+        After connect() gave up this is always the 'give_up' Command."""
+        if self.gave_up:
+            return Command('', 'give_up', None, time.time())
+        try:
+            return self.commands.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def read_command(self):
+        """Non-blocking: the next line, or "" if none is waiting."""
+        cmd = self.get_command(timeout=0)
+        return cmd.line if cmd is not None else ""
 
     def unlock(self):
         with self._lock:
@@ -161,6 +272,7 @@ class ArduinoHandler:
             self._reconnecting = True
             ser = self.ser
             self.ser = None
+            self.connected.clear()
             if self._disconnected_since is None:
                 self._disconnected_since = time.time()
                 if self.event_logger is not None:
@@ -179,10 +291,14 @@ class ArduinoHandler:
             with self._lock:
                 self._reconnecting = False
 
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
+
     def close(self):
         with self._lock:
             ser = self.ser
             self.ser = None
+            self.connected.clear()
         if ser is not None:
             ser.close()
             logging.info("Closed serial connection to Arduino")
\ No newline at end of file
@@ -0,0 +1,353 @@
+"""Offline micro-benchmarks. They run on synthetic data, without the camera,
+the serial port or MQTT, so numbers are comparable between boards.
+
+    python bench.py mjpeg [--frames 200] [--chunk 16384]
+    python bench.py match [--per-person 5] [--queries 20]
+    python bench.py ann [--per-person 10] [--queries 500]
+    python bench.py storage [--dir /tmp]
+    python bench.py sprt [--traces /data/similarity_traces.jsonl] [--synthetic 2000]
+    python bench.py embed [--sizes 1 2 4 8] [--rounds 20] [--variant fp32]
+
+embed is the one that needs the models (onnxruntime + insightface).
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import tempfile
+import time
+
+import numpy as np
+
+from evidence import Evidence
+from face_gallery import FaceGallery, normalize
+from face_index import IVFIndex, measure_recall
+from mjpeg_parser import MjpegParser
+
+RESOLUTIONS = [(640, 480), (1280, 720), (1920, 1080), (2560, 1440)]
+
+
+def _fake_jpeg(size, rnd):
+    """SOI + marker-free payload + EOI. Parsing never looks inside the payload,
+    so random bytes stand in for entropy-coded data (and need no OpenCV)."""
+    body = bytes(rnd.getrandbits(8) for _ in range(min(size, 4096))).replace(b'\xff', b'\xfe')
+    body = (body * (size // len(body) + 1))[:size]
+    return b'\xff\xd8' + body + b'\xff\xd9'
+
+
+def _mjpeg_stream(jpeg, frames, content_length=True):
+    if content_length:
+        head = b'--BoundaryString\r\nContent-Type: image/jpeg\r\nContent-Length: %d\r\n\r\n' % len(jpeg)
+    else:
+        head = b'--BoundaryString\r\nContent-Type: image/jpeg\r\n\r\n'
+    return (head + jpeg + b'\r\n') * frames
+
+
+def _legacy_parse(stream, chunk):
+    """The original _capture_stream loop: immutable bytes += chunk, two find()
+    scans from offset 0, at most one frame per read. Returns (frames, copied)."""
+    bytes_buffer = bytes()
+    frames = copied = 0
+    for i in range(0, len(stream), chunk):
+        c = stream[i:i + chunk]
+        copied += len(bytes_buffer) + len(c)  # += builds a new bytes object
+        bytes_buffer += c
+        a = bytes_buffer.find(b'\xff\xd8')
+        b = bytes_buffer.find(b'\xff\xd9')
+        if a != -1 and b != -1:
+            jpg = bytes_buffer[a:b + 2]
+            bytes_buffer = bytes_buffer[b + 2:]
+            copied += len(jpg) + len(bytes_buffer)
+            frames += 1
+    return frames, copied
+
+
+def bench_mjpeg(args):
+    rnd = random.Random(0)
+    print(f'{"resolution":>10} {"jpeg KB":>8} | {"parser":<16} {"frames":>6} '
+          f'{"copied/frame KB":>15} {"us/frame":>9}')
+    for w, h in RESOLUTIONS:
+        jpeg = _fake_jpeg(int(w * h * args.bytes_per_pixel), rnd)
+        cases = [
+            ('legacy', _mjpeg_stream(jpeg, args.frames)),
+            ('content-length', _mjpeg_stream(jpeg, args.frames)),
+            ('marker scan', _mjpeg_stream(jpeg, args.frames, content_length=False)),
+        ]
+        for label, stream in cases:
+            t0 = time.perf_counter()
+            if label == 'legacy':
+                frames, copied = _legacy_parse(stream, args.chunk)
+            else:
+                p = MjpegParser(boundary='BoundaryString')
+                frames = 0
+                for i in range(0, len(stream), args.chunk):
+                    frames += len(p.feed(stream[i:i + args.chunk]))
+                copied = p.bytes_copied
+            dt = time.perf_counter() - t0
+            print(f'{f"{w}x{h}":>10} {len(jpeg) / 1024:8.0f} | {label:<16} {frames:6d} '
+                  f'{copied / max(frames, 1) / 1024:15.1f} {dt / max(frames, 1) * 1e6:9.1f}')
+
+
+def _legacy_match(embedding, encodings):
+    """The original FaceRecognizer._match: Python loop, both norms every call."""
+    def sim(e1, e2):
+        return float(np.dot(e1, e2) / (np.linalg.norm(e1) * np.linalg.norm(e2)))
+    sims = [max(sim(embedding, e) for e in embs) for embs in encodings]
+    return int(np.argmax(sims))
+
+
+def bench_match(args):
+    rng = np.random.default_rng(0)
+    print(f'{"embeddings":>10} {"people":>7} | {"legacy ms":>10} {"matrix ms":>10} {"speedup":>8}')
+    for n in (10, 100, 1000, 10000, 100000):
+        people = max(1, n // args.per_person)
+        emb = rng.standard_normal((n, 512)).astype(np.float32)
+        encodings = [list(emb[i::people]) for i in range(people)]
+        gallery = FaceGallery()
+        gallery.set([f'p{i}' for i in range(people)], encodings)
+        queries = rng.standard_normal((args.queries, 512)).astype(np.float32)
+
+        t0 = time.perf_counter()
+        for q in queries:
+            gallery.best(q)
+        fast = (time.perf_counter() - t0) / len(queries) * 1000
+
+        # The legacy loop takes seconds per query at 100k — sample fewer.
+        lq = queries[:max(1, min(len(queries), 20000 // n))]
+        t0 = time.perf_counter()
+        for q in lq:
+            _legacy_match(q, encodings)
+        slow = (time.perf_counter() - t0) / len(lq) * 1000
+        print(f'{n:10d} {people:7d} | {slow:10.2f} {fast:10.3f} {slow / fast:7.0f}x')
+
+
+def _clustered_gallery(people, per_person, rng, spread=0.035):
+    """Synthetic faces: a random identity direction per person plus per-capture
+    noise (spread 0.035 gives ~0.8 same-person cosine, like real ArcFace)."""
+    centers = normalize(rng.standard_normal((people, 512)))
+    person = np.repeat(np.arange(people), per_person)
+    rows = normalize(centers[person] + rng.standard_normal((len(person), 512)) * spread)
+    return centers, person, rows.astype(np.float32)
+
+
+def bench_ann(args):
+    rng = np.random.default_rng(0)
+    print(f'{"embeddings":>10} {"people":>7} | {"build s":>8} {"nlist":>6} {"nprobe":>6} '
+          f'{"recall":>7} {"exact ms":>9} {"ivf ms":>7}')
+    for n in (5000, 20000, 50000, 100000):
+        people = n // args.per_person
+        centers, person, matrix = _clustered_gallery(people, args.per_person, rng)
+        t0 = time.perf_counter()
+        index = IVFIndex.build(matrix, nprobe=args.nprobe)
+        build = time.perf_counter() - t0
+        who = rng.integers(0, people, args.queries)
+        queries = normalize(centers[who] + rng.standard_normal((args.queries, 512)) * 0.035)
+        r = measure_recall(index, matrix, person, queries)
+        print(f'{n:10d} {people:7d} | {build:8.1f} {len(index.lists):6d} {index.nprobe:6d} '
+              f'{r["recall"]:7.3f} {r["exact_ms"]:9.2f} {r["index_ms"]:7.2f}')
+
+
+def _rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def bench_storage(args):
+    """Legacy faces_data.json vs the memory-mapped binary gallery: load time,
+    file size and peak-RSS growth. JSON is skipped above 10k rows (it needs
+    gigabytes of RAM just to parse)."""
+    rng = np.random.default_rng(0)
+    print(f'{"embeddings":>10} | {"json MB":>8} {"json load s":>11} {"json +RSS MB":>12} | '
+          f'{"npy MB":>7} {"mmap load ms":>12} {"first match ms":>14}')
+    with tempfile.TemporaryDirectory(dir=args.dir) as d:
+        for n in (1000, 10000, 100000):
+            people = n // 5
+            _, _, matrix = _clustered_gallery(people, 5, rng)
+            encodings = [matrix[i * 5:(i + 1) * 5] for i in range(people)]
+            names = [f'p{i}' for i in range(people)]
+
+            json_cols = ['-'] * 3
+            if n <= 10000:
+                jpath = os.path.join(d, f'faces_{n}.json')
+                with open(jpath, 'w') as f:
+                    json.dump({'names': names, 'encodings': [e.tolist() for e in encodings]}, f)
+                rss0, t0 = _rss_mb(), time.perf_counter()
+                with open(jpath) as f:
+                    data = json.load(f)
+                FaceGallery(index_backend='exact').set(
+                    data['names'], [[np.array(e) for e in embs] for embs in data['encodings']])
+                json_cols = [f'{os.path.getsize(jpath) / 2**20:.1f}', f'{time.perf_counter() - t0:.2f}',
+                             f'{_rss_mb() - rss0:.0f}']
+                del data
+
+            g = FaceGallery(index_backend='exact')
+            g.set(names, encodings)
+            mpath = os.path.join(d, f'faces_{n}.manifest.json')
+            g.save(mpath)
+            npy = os.path.join(d, json.load(open(mpath))['matrix'])
+            t0 = time.perf_counter()
+            h = FaceGallery(index_backend='exact')
+            h.load(mpath)
+            load_ms = (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            h.best(matrix[0])
+            first_ms = (time.perf_counter() - t0) * 1000
+            print(f'{n:10d} | {json_cols[0]:>8} {json_cols[1]:>11} {json_cols[2]:>12} | '
+                  f'{os.path.getsize(npy) / 2**20:7.1f} {load_ms:12.1f} {first_ms:14.1f}')
+
+
+def _streak_decide(frames, threshold=0.50, required=2):
+    """The old rule: `required` consecutive frames matching the same person;
+    a no-face or non-matching frame resets. Returns (name, ms) or None."""
+    pending, streak = None, 0
+    for t_ms, name, sim in frames:
+        if name is None or sim < threshold:
+            pending, streak = None, 0
+            continue
+        streak = streak + 1 if name == pending else 1
+        pending = name
+        if streak >= required:
+            return name, t_ms
+    return None
+
+
+def _sprt_decide(frames, threshold=0.50):
+    """Replay a trace through evidence.Evidence, as _do_capture does."""
+    ev = Evidence()
+    for t_ms, name, sim in frames:
+        if name is None:
+            ev.miss()
+            continue
+        v = ev.update(name, sim)
+        if v and v[0] == 'accept' and v[2] >= threshold:
+            return v[1], t_ms
+    return None
+
+
+def _synthetic_traces(n, rng, frames=40, frame_ms=140, drop=0.15):
+    """Half genuine (the visitor is 'alice'), half impostor traces. Each
+    visitor gets their own mean similarity, so some genuine traces hover
+    just above the threshold and some impostors just below it."""
+    traces = []
+    for i in range(n):
+        genuine = i % 2 == 0
+        mean = rng.uniform(0.50, 0.85) if genuine else rng.uniform(0.15, 0.42)
+        out = []
+        for f in range(frames):
+            if rng.random() < drop:
+                out.append([f * frame_ms, None, None])
+                continue
+            sim = min(1.0, max(-1.0, rng.gauss(mean, 0.08)))
+            name = 'alice' if genuine else rng.choice(['alice', 'bob', 'carol'])
+            out.append([f * frame_ms, name, round(sim, 4)])
+        traces.append({'frames': out, 'label': 'alice' if genuine else None})
+    return traces
+
+
+def bench_sprt(args):
+    """Fixed 2-frame streak vs the SPRT evidence accumulator, replayed on
+    recorded similarity traces and/or synthetic ones. A trace's ground truth
+    is its 'label' key (null = nobody enrolled); recorded traces without one
+    are assumed to have been decided correctly live ('result')."""
+    traces = []
+    if args.traces:
+        with open(args.traces) as f:
+            for line in f:
+                if line.strip():
+                    t = json.loads(line)
+                    t.setdefault('label', t.get('result'))
+                    traces.append(t)
+    if args.synthetic:
+        traces += _synthetic_traces(args.synthetic, random.Random(0))
+    if not traces:
+        print('no traces (pass --traces and/or --synthetic)')
+        return
+    genuine = [t for t in traces if t['label']]
+    impostor = [t for t in traces if not t['label']]
+    print(f'{len(genuine)} genuine, {len(impostor)} impostor traces')
+    print(f'{"rule":>7} | {"accepted":>8} {"median ms":>9} {"p90 ms":>7} {"frames":>6} | '
+          f'{"false accept":>12} {"wrong person":>12}')
+    for rule, decide in (('streak', _streak_decide), ('sprt', _sprt_decide)):
+        lat, nframes, wrong = [], [], 0
+        for t in genuine:
+            d = decide(t['frames'])
+            if d is None:
+                continue
+            if d[0] != t['label']:
+                wrong += 1
+                continue
+            lat.append(d[1])
+            nframes.append(next(i for i, f in enumerate(t['frames']) if f[0] == d[1]) + 1)
+        fa = sum(1 for t in impostor if decide(t['frames']) is not None)
+        med = f'{np.median(lat):9.0f}' if lat else f'{"-":>9}'
+        p90 = f'{np.percentile(lat, 90):7.0f}' if lat else f'{"-":>7}'
+        fr = f'{np.median(nframes):6.0f}' if nframes else f'{"-":>6}'
+        far = f'{fa / len(impostor):12.4f}' if impostor else f'{"-":>12}'
+        print(f'{rule:>7} | {len(lat) / max(len(genuine), 1):8.3f} {med} {p90} {fr} | {far} {wrong:12d}')
+
+
+def bench_embed(args):
+    """ArcFace cost per batch size, for EMBED_BATCH / PIPELINE_DEPTH: a batch
+    is worth it while per-face ms keeps dropping."""
+    import model_loader   # needs onnxruntime; the other benchmarks don't
+    _, rec, report = model_loader.load_models(variant=args.variant)
+    print(model_loader.format_report(report))
+    rng = np.random.default_rng(0)
+    crops = [rng.integers(0, 256, (112, 112, 3), dtype=np.uint8) for _ in range(max(args.sizes))]
+    rec.get_feat(crops[:1])   # first call allocates the session buffers
+    print(f'{"batch":>5} {"ms/call":>8} {"ms/face":>8} {"faces/s":>8} {"vs 1":>6}')
+    single = None
+    for n in sorted(args.sizes):
+        rec.get_feat(crops[:n])   # warm this shape
+        t0 = time.perf_counter()
+        for _ in range(args.rounds):
+            rec.get_feat(crops[:n])
+        ms = (time.perf_counter() - t0) * 1000 / args.rounds
+        per_face = ms / n
+        single = per_face if single is None else single
+        print(f'{n:5d} {ms:8.1f} {per_face:8.1f} {1000 / per_face:8.1f} {single / per_face:5.2f}x')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = ap.add_subparsers(dest='cmd', required=True)
+
+    p = sub.add_parser('mjpeg', help='MJPEG parser: bytes copied and parse time per frame')
+    p.add_argument('--frames', type=int, default=200)
+    p.add_argument('--chunk', type=int, default=16384)
+    p.add_argument('--bytes-per-pixel', type=float, default=0.12,
+                   help='synthetic JPEG size (typical motionEye quality ~0.1-0.15)')
+    p.set_defaults(fn=bench_mjpeg)
+
+    p = sub.add_parser('match', help='gallery match latency vs gallery size')
+    p.add_argument('--per-person', type=int, default=5, help='embeddings per enrolled person')
+    p.add_argument('--queries', type=int, default=20)
+    p.set_defaults(fn=bench_match)
+
+    p = sub.add_parser('ann', help='IVF index recall and latency vs the exact scan')
+    p.add_argument('--per-person', type=int, default=10)
+    p.add_argument('--queries', type=int, default=500)
+    p.add_argument('--nprobe', type=int, default=None, help='lists probed (default nlist/8)')
+    p.set_defaults(fn=bench_ann)
+
+    p = sub.add_parser('storage', help='JSON vs memory-mapped gallery load time and memory')
+    p.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    p.set_defaults(fn=bench_storage)
+
+    p = sub.add_parser('sprt', help='streak vs SPRT: bell->unlock latency and false accepts on traces')
+    p.add_argument('--traces', default=None, help='similarity_traces.jsonl recorded by the add-on')
+    p.add_argument('--synthetic', type=int, default=0, help='also replay N synthetic traces')
+    p.set_defaults(fn=bench_sprt)
+
+    p = sub.add_parser('embed', help='ArcFace per-face latency vs batch size (needs the models)')
+    p.add_argument('--sizes', type=int, nargs='+', default=[1, 2, 4, 8])
+    p.add_argument('--rounds', type=int, default=20)
+    p.add_argument('--variant', default='fp32', help='model_loader variant to time')
+    p.set_defaults(fn=bench_embed)
+
+    args = ap.parse_args()
+    args.fn(args)
+
+
+if __name__ == '__main__':
+    main()
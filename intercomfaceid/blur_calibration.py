@@ -2,10 +2,80 @@ import json
 import os
 import threading
 import logging
+import random
+import time
 from datetime import datetime
 
 BIN_WIDTH = 20      # sharpness (Laplacian variance) bucket size
 MAX_BIN = 800       # values above this are lumped into the top bucket
+# Share of below-threshold faces embedded anyway, at random. Without them a
+# raised threshold would hide every blurry match from the calibration, and
+# the threshold could only ever go up.
+EXPLORE_RATE = 0.1
+
+
+def _p5_floor(bins):
+    """Bin floor of the 5th-percentile matched sample, or None with no matches.
+    Uses the sampling-weighted match counts ('matched_w', see record_batch);
+    bins recorded before those existed count as they are."""
+    weights = [(int(k), bins[k].get('matched_w', bins[k]['matched'])) for k in bins]
+    total = sum(w for _, w in weights)
+    if total <= 0:
+        return None
+    cum = 0.0
+    for floor, w in sorted(weights):
+        cum += w
+        if w > 0 and cum >= total * 0.05:
+            return floor
+    return None
+
+
+class BlurGate:
+    """One session's blur gate in front of the embedding step.
+
+    decide() says whether a detected face is worth embedding: 'auto' if its
+    crop is at least `threshold` sharp, 'forced' if nothing has been embedded
+    for `force_after_ms` (so recognition is never starved), 'explore' for a
+    random `explore_rate` of the rest, else None (skip). Processed faces are
+    fed back via sample() with the decision that let them through, and end
+    up in BlurCalibration.
+    """
+
+    def __init__(self, threshold, force_after_ms, explore_rate=EXPLORE_RATE):
+        self.threshold = threshold
+        self.force_after_ms = force_after_ms
+        self.explore_rate = explore_rate
+        self.last_embed = 0.0
+        self.auto_processed = 0
+        self.forced_processed = 0
+        self.explored_processed = 0
+        self.skipped_blurry = 0
+        self.samples = []          # (sharpness, matched, below threshold) of processed faces
+
+    def decide(self, sharpness, now=None):
+        now = time.time() if now is None else now
+        if sharpness >= self.threshold:
+            self.auto_processed += 1
+            decision = 'auto'
+        elif (now - self.last_embed) * 1000 >= self.force_after_ms:
+            self.forced_processed += 1
+            decision = 'forced'
+        elif random.random() < self.explore_rate:
+            self.explored_processed += 1
+            decision = 'explore'
+        else:
+            self.skipped_blurry += 1
+            return None
+        self.last_embed = now
+        return decision
+
+    def sample(self, sharpness, matched, decision='auto'):
+        self.samples.append((sharpness, bool(matched), decision != 'auto'))
+
+    def stats(self):
+        return {'auto_processed': self.auto_processed, 'forced_processed': self.forced_processed,
+                'explored_processed': self.explored_processed,
+                'skipped_blurry': self.skipped_blurry, 'blur_threshold': self.threshold}
 
 
 class BlurCalibration:
@@ -31,6 +101,7 @@ class BlurCalibration:
                     d.setdefault('bins', {})
                     d.setdefault('forced_processed', 0)
                     d.setdefault('auto_processed', 0)
+                    d.setdefault('explored_processed', 0)
                     d.setdefault('skipped_blurry', 0)
                     d.setdefault('total_matched', 0)
                     return d
@@ -40,6 +111,7 @@ class BlurCalibration:
             'bins': {},               # bin_floor(str) -> {'n': int, 'matched': int}
             'forced_processed': 0,    # processed despite being below threshold (failsafe)
             'auto_processed': 0,      # processed because at/above threshold
+            'explored_processed': 0,  # below threshold, processed at random (EXPLORE_RATE)
             'skipped_blurry': 0,      # below threshold AND failsafe didn't fire
             'total_matched': 0,
             'blur_threshold': None,
@@ -52,22 +124,37 @@ class BlurCalibration:
         return str(b)
 
     def record_batch(self, samples, forced_processed, auto_processed,
-                     skipped_blurry, blur_threshold=None, force_after_ms=None):
-        """samples: list of (sharpness, matched_bool) for processed frames."""
+                     skipped_blurry, blur_threshold=None, force_after_ms=None,
+                     explored_processed=0):
+        """samples: list of (sharpness, matched_bool, below_threshold_bool) for
+        processed frames.
+
+        Once a threshold is in force, faces below it are only embedded when
+        the failsafe fires or exploration picks them — a small share of them,
+        regardless of how sharp they are. Counted as is, blurry matches would
+        be under-represented and the p5 would creep up session after session.
+        So each below-threshold match is also counted in 'matched_w' with the
+        inverse of this session's below-threshold sampling rate, as if every
+        blurry face had been embedded."""
         if not samples and not skipped_blurry:
             return
+        sampled = forced_processed + explored_processed
+        below_weight = (sampled + skipped_blurry) / sampled if sampled else 1.0
         with self._lock:
             bins = self.data['bins']
-            for sharp, matched in samples:
+            for sharp, matched, below in samples:
                 k = self._bin_key(sharp)
                 if k not in bins:
                     bins[k] = {'n': 0, 'matched': 0}
-                bins[k]['n'] += 1
+                b = bins[k]
+                b['n'] += 1
                 if matched:
-                    bins[k]['matched'] += 1
+                    b['matched_w'] = b.get('matched_w', b['matched']) + (below_weight if below else 1.0)
+                    b['matched'] += 1
                     self.data['total_matched'] += 1
             self.data['forced_processed'] += forced_processed
             self.data['auto_processed'] += auto_processed
+            self.data['explored_processed'] += explored_processed
             self.data['skipped_blurry'] += skipped_blurry
             if blur_threshold is not None:
                 self.data['blur_threshold'] = blur_threshold
@@ -76,6 +163,31 @@ class BlurCalibration:
             self.data['updated'] = datetime.now().isoformat()
             self._save_locked()
 
+    def record_async(self, gate, on_done=None):
+        """record_batch() a finished BlurGate on a background thread, so the
+        JSON rewrite never delays the unlock; on_done() runs afterwards."""
+        def run():
+            try:
+                self.record_batch(gate.samples, gate.forced_processed, gate.auto_processed,
+                                  gate.skipped_blurry, gate.threshold, gate.force_after_ms,
+                                  gate.explored_processed)
+            except Exception as e:
+                logging.warning(f'Could not record blur calibration: {e}')
+            if on_done is not None:
+                on_done()
+        threading.Thread(target=run, daemon=True, name='blur-calibration').start()
+
+    def adaptive_threshold(self, lower, upper, min_matches):
+        """The p5 matched floor clamped to [lower, upper], or None until at
+        least `min_matches` matched samples have been collected."""
+        with self._lock:
+            if self.data['total_matched'] < min_matches:
+                return None
+            p5 = _p5_floor(self.data['bins'])
+        if p5 is None:
+            return None
+        return float(min(max(p5, lower), upper))
+
     def _save_locked(self):
         tmp = self.path + '.tmp'
         with open(tmp, 'w') as f:
@@ -89,7 +201,8 @@ class BlurCalibration:
         bins = data['bins']
         floors = sorted(int(k) for k in bins.keys())
         hist = [
-            {'floor': fl, 'n': bins[str(fl)]['n'], 'matched': bins[str(fl)]['matched']}
+            {'floor': fl, 'n': bins[str(fl)]['n'], 'matched': bins[str(fl)]['matched'],
+             'matched_weighted': round(bins[str(fl)].get('matched_w', bins[str(fl)]['matched']), 1)}
             for fl in floors
         ]
 
@@ -102,19 +215,14 @@ class BlurCalibration:
                 break
 
         # Stricter: 5th-percentile of matched sharpness (tolerates a rare low outlier).
-        matched_floors = []
-        for h in hist:
-            matched_floors.extend([h['floor']] * h['matched'])
-        p5_floor = None
-        if matched_floors:
-            idx = max(0, int(len(matched_floors) * 0.05) - 1)
-            p5_floor = sorted(matched_floors)[idx]
+        p5_floor = _p5_floor(bins)
 
-        total_processed = data['forced_processed'] + data['auto_processed']
+        total_processed = data['forced_processed'] + data['auto_processed'] + data['explored_processed']
         return {
             'histogram': hist,
             'forced_processed': data['forced_processed'],
             'auto_processed': data['auto_processed'],
+            'explored_processed': data['explored_processed'],
             'skipped_blurry': data['skipped_blurry'],
             'total_processed': total_processed,
             'total_matched': data['total_matched'],
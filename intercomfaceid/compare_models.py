@@ -0,0 +1,175 @@
+"""Compare two model variants (model_loader.VARIANTS) on stored data: per-stage
+latency, embedding agreement, and whether they reach the same match
+decisions against the enrolled gallery.
+
+    python compare_models.py [--a fp32] [--b int8_static]
+                             [--images /data/snapshots /data/face_snapshots] [--limit 300]
+                             [--manifest /config/faces_data.manifest.json] [--json out.json]
+
+Every image is detected by both variants. Where A finds a face, its aligned
+crop is embedded by both (recognizer agreement on identical input), and B
+also embeds the crop aligned from its own detection (end-to-end agreement).
+The gallery was enrolled with whatever variant ran at the time (normally
+fp32) — exactly what a switched add-on would match against.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+from insightface.utils import face_align
+
+import model_loader
+from face_gallery import FaceGallery, normalize
+from face_recognizer import MATCH_THRESHOLD
+from quantize_models import DET_SIZE, calibration_images
+
+
+def _largest(det, img):
+    t0 = time.perf_counter()
+    bboxes, kpss = det.detect(img, input_size=DET_SIZE, max_num=0, metric='default')
+    ms = (time.perf_counter() - t0) * 1000
+    if bboxes is None or bboxes.shape[0] == 0:
+        return None, ms
+    i = int(np.argmax((bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])))
+    return (bboxes[i], kpss[i]), ms
+
+
+def _embed(rec, img, kps):
+    crop = face_align.norm_crop(img, landmark=kps, image_size=112)
+    t0 = time.perf_counter()
+    emb = normalize(rec.get_feat([crop])[0])
+    return emb, (time.perf_counter() - t0) * 1000
+
+
+def _iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def _decision(gallery, emb, threshold):
+    best = gallery.best(emb) if len(gallery) else None
+    if best is None:
+        return None, None
+    return (best[0] if best[1] >= threshold else None), best[1]
+
+
+def _lat(ms):
+    if not ms:
+        return None
+    a = np.asarray(ms)
+    return {'mean': round(float(a.mean()), 1), 'p50': round(float(np.percentile(a, 50)), 1),
+            'p95': round(float(np.percentile(a, 95)), 1), 'n': len(ms)}
+
+
+def compare(a, b, images, limit, manifest, threshold=MATCH_THRESHOLD):
+    det_a, rec_a, rep_a = model_loader.load_models(det_size=DET_SIZE, variant=a)
+    det_b, rec_b, rep_b = model_loader.load_models(det_size=DET_SIZE, variant=b)
+    gallery = FaceGallery()
+    if manifest and os.path.exists(manifest):
+        gallery.load(manifest)
+
+    lat = {k: [] for k in ('detect_a', 'detect_b', 'embed_a', 'embed_b')}
+    found = {'both': 0, 'a_only': 0, 'b_only': 0, 'neither': 0}
+    ious, cos_same, cos_e2e = [], [], []
+    agree_same = agree_e2e = decided = 0
+    disagreements = []
+    n = 0
+    for n, (path, img) in enumerate(calibration_images(images, limit), 1):
+        face_a, ms = _largest(det_a, img)
+        lat['detect_a'].append(ms)
+        face_b, ms = _largest(det_b, img)
+        lat['detect_b'].append(ms)
+        found['both' if face_a and face_b else 'a_only' if face_a else 'b_only' if face_b else 'neither'] += 1
+        if face_a is None:
+            continue
+        if face_b is not None:
+            ious.append(_iou(face_a[0], face_b[0]))
+
+        emb_a, ms = _embed(rec_a, img, face_a[1])
+        lat['embed_a'].append(ms)
+        emb_b, ms = _embed(rec_b, img, face_a[1])
+        lat['embed_b'].append(ms)
+        cos_same.append(float(emb_a @ emb_b))
+
+        dec_a, sim_a = _decision(gallery, emb_a, threshold)
+        dec_same, _ = _decision(gallery, emb_b, threshold)
+        if face_b is not None:
+            emb_e2e, _ = _embed(rec_b, img, face_b[1])
+            cos_e2e.append(float(emb_a @ emb_e2e))
+            dec_e2e, sim_e2e = _decision(gallery, emb_e2e, threshold)
+        else:
+            dec_e2e, sim_e2e = None, None
+        decided += 1
+        agree_same += dec_a == dec_same
+        agree_e2e += dec_a == dec_e2e
+        if dec_a != dec_e2e and len(disagreements) < 20:
+            disagreements.append({'image': path, a: dec_a, f'{a}_sim': sim_a and round(sim_a, 3),
+                                  b: dec_e2e, f'{b}_sim': sim_e2e and round(sim_e2e, 3)})
+
+    def dist(v):
+        if not v:
+            return None
+        v = np.asarray(v)
+        return {'mean': round(float(v.mean()), 4), 'p5': round(float(np.percentile(v, 5)), 4),
+                'min': round(float(v.min()), 4)}
+
+    return {
+        'a': a, 'b': b, 'images': n, 'gallery_people': len(gallery), 'threshold': threshold,
+        'models': {a: rep_a, b: rep_b},
+        'latency_ms': {k: _lat(v) for k, v in lat.items()},
+        'faces_found': found,
+        'det_iou': dist(ious),
+        'embedding_cos_same_crop': dist(cos_same),
+        'embedding_cos_end_to_end': dist(cos_e2e),
+        'decision_agreement_same_crop': round(agree_same / decided, 4) if decided else None,
+        'decision_agreement_end_to_end': round(agree_e2e / decided, 4) if decided else None,
+        'disagreements': disagreements,
+    }
+
+
+def print_report(r):
+    a, b = r['a'], r['b']
+    print(f"{r['images']} images, gallery of {r['gallery_people']} people, threshold {r['threshold']}")
+    for role in ('detection', 'recognition'):
+        va, vb = r['models'][a][role]['variant'], r['models'][b][role]['variant']
+        if va == vb:
+            print(f'  note: {role} ran {va} for both (variant file missing?)')
+    print(f"{'stage':<8} {a:>22} {b:>22} {'speed-up':>9}")
+    for stage in ('detect', 'embed'):
+        la, lb = r['latency_ms'][f'{stage}_a'], r['latency_ms'][f'{stage}_b']
+        if not la or not lb:
+            continue
+        fmt = lambda l: f"{l['mean']:.1f} (p95 {l['p95']:.1f}) ms"
+        print(f"{stage:<8} {fmt(la):>22} {fmt(lb):>22} {la['mean'] / lb['mean']:>8.2f}x")
+    print(f"faces found: {r['faces_found']}   box IoU: {r['det_iou']}")
+    print(f"embedding cosine {a} vs {b}, same crop: {r['embedding_cos_same_crop']}")
+    print(f"                        end to end: {r['embedding_cos_end_to_end']}")
+    print(f"match decisions agree: same crop {r['decision_agreement_same_crop']}, "
+          f"end to end {r['decision_agreement_end_to_end']}")
+    for d in r['disagreements']:
+        print(f'  disagree: {d}')
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('--a', default='fp32', choices=model_loader.VARIANTS)
+    ap.add_argument('--b', default='int8_static', choices=model_loader.VARIANTS)
+    ap.add_argument('--images', nargs='+', default=['/data/snapshots', '/data/face_snapshots'])
+    ap.add_argument('--limit', type=int, default=300)
+    ap.add_argument('--manifest', default='/config/faces_data.manifest.json')
+    ap.add_argument('--json', default=None, help='also write the full report here')
+    args = ap.parse_args()
+    report = compare(args.a, args.b, args.images, args.limit, args.manifest)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
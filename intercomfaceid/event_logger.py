@@ -11,6 +11,7 @@ from datetime import datetime
 class EventLogger:
     def __init__(self, data_dir='/data'):
         self.events_file = os.path.join(data_dir, 'events.jsonl')
+        self.traces_file = os.path.join(data_dir, 'similarity_traces.jsonl')
         self.snapshots_dir = os.path.join(data_dir, 'snapshots')
         self.face_snapshots_dir = os.path.join(data_dir, 'face_snapshots')
         self._lock = threading.Lock()
@@ -18,13 +19,24 @@ class EventLogger:
         os.makedirs(self.face_snapshots_dir, exist_ok=True)
         logging.info("EventLogger initialized")
 
-    def log(self, event_type, **kwargs):
-        event = {'timestamp': datetime.now().isoformat(), 'type': event_type, **kwargs}
+    def log(self, event_type, at=None, **kwargs):
+        """Append an event. `at` (a time.time()) stamps it with when it
+        happened, for events logged after the fact; default now."""
+        when = datetime.fromtimestamp(at) if at is not None else datetime.now()
+        event = {'timestamp': when.isoformat(), 'type': event_type, **kwargs}
         with self._lock:
             with open(self.events_file, 'a') as f:
                 f.write(json.dumps(event) + '\n')
         return event
 
+    def save_trace(self, frames, **kwargs):
+        """Append one recognition session's per-frame [ms, name, similarity]
+        trace (name None = no face), for offline replay by bench.py sprt."""
+        trace = {'timestamp': datetime.now().isoformat(), 'frames': frames, **kwargs}
+        with self._lock:
+            with open(self.traces_file, 'a') as f:
+                f.write(json.dumps(trace) + '\n')
+
     def get_recent(self, limit=200):
         if not os.path.exists(self.events_file):
             return []
@@ -61,10 +73,16 @@ class EventLogger:
         return events
 
     def save_snapshot(self, frame, prefix='event'):
+        """frame: a decoded image, or the original JPEG bytes from the stream —
+        those are written as-is, with no decode / re-encode round trip."""
         ts = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
         filename = f'{prefix}_{ts}.jpg'
         path = os.path.join(self.snapshots_dir, filename)
-        cv2.imwrite(path, frame)
+        if isinstance(frame, (bytes, bytearray, memoryview)):
+            with open(path, 'wb') as f:
+                f.write(frame)
+        else:
+            cv2.imwrite(path, frame)
         self._prune_snapshots()
         return filename
 
@@ -0,0 +1,81 @@
+import math
+
+# Similarity of a live embedding to the best gallery person, modelled as two
+# Gaussians with a shared spread. Fit these from recorded traces (bench.py sprt).
+GENUINE_MEAN = 0.70   # the visitor IS that person
+IMPOSTOR_MEAN = 0.30  # someone else / unknown face
+SIM_STD = 0.12
+FALSE_ACCEPT = 0.02   # SPRT alpha (Wald bound, conservative in practice: the synthetic
+                      # replay gives ~0.7% false accepts vs ~2% for the old 2-frame streak)
+FALSE_REJECT = 0.05   # SPRT beta: target rate of rejecting the genuine person
+MAX_GAP = 3           # frames without evidence tolerated before the sum is dropped
+
+
+class Evidence:
+    """Sequential probability ratio test on per-frame match similarities.
+
+    Every embedded frame adds the log-likelihood ratio of its similarity
+    (genuine vs impostor) to the running sum for the current candidate person.
+    The candidate is accepted once the sum reaches log((1 - beta) / alpha): a
+    single very high score gets there in one frame, while scores just above
+    the threshold need several. A sum that falls to log(beta / (1 - alpha)) is
+    a confident reject. Frames with no face don't reset anything unless more
+    than `max_gap` of them come in a row.
+
+    update() returns ('accept', name, sim), ('reject', name, sim) or None.
+    """
+
+    def __init__(self, genuine_mean=GENUINE_MEAN, impostor_mean=IMPOSTOR_MEAN, std=SIM_STD,
+                 alpha=FALSE_ACCEPT, beta=FALSE_REJECT, max_gap=MAX_GAP):
+        self.slope = (genuine_mean - impostor_mean) / (std * std)
+        self.mid = (genuine_mean + impostor_mean) / 2
+        self.upper = math.log((1 - beta) / alpha)
+        self.lower = math.log(beta / (1 - alpha))
+        self.max_gap = max_gap
+        self.reset()
+        self.frames = 0
+        self.rejects = 0
+
+    def reset(self):
+        self.candidate = None
+        self.total = 0.0
+        self.best_sim = None
+        self.gap = 0
+
+    def llr(self, sim):
+        """Log-likelihood ratio of one similarity. Equal spreads make it linear;
+        negative evidence is capped so one bad frame can't wipe out a run."""
+        return max(self.slope * (sim - self.mid), self.lower / 2)
+
+    def update(self, name, sim):
+        """Feed the best gallery match (name, similarity) of an embedded frame."""
+        self.frames += 1
+        self.gap = 0
+        llr = self.llr(sim)
+        if name != self.candidate:
+            if llr > 0 or self.candidate is None:
+                # A different person now leads: start over on them.
+                self.candidate, self.total, self.best_sim = name, 0.0, None
+            # else: a weak hit on someone else is evidence against the candidate
+            # too (the candidate scored no higher), so it counts below.
+        self.total += llr
+        if name == self.candidate:
+            self.best_sim = sim if self.best_sim is None else max(self.best_sim, sim)
+        if self.total >= self.upper:
+            return 'accept', self.candidate, self.best_sim
+        if self.total <= self.lower:
+            self.rejects += 1
+            result = 'reject', self.candidate, self.best_sim
+            self.reset()
+            return result
+        return None
+
+    def miss(self):
+        """A frame with no face. Only a longer run of them drops the evidence."""
+        self.gap += 1
+        if self.gap > self.max_gap:
+            self.reset()
+
+    def stats(self):
+        return {'evidence_frames': self.frames, 'evidence_llr': round(self.total, 2),
+                'confident_rejects': self.rejects}
@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from face_index import ExactIndex, build_index, measure_recall, wants_ann
+
+
+def normalize(embeddings):
+    """L2-normalise a vector or the rows of a matrix, as float32."""
+    e = np.asarray(embeddings, dtype=np.float32)
+    n = np.linalg.norm(e, axis=-1, keepdims=True)
+    return e / np.maximum(n, 1e-12)
+
+
+class FaceGallery:
+    """Every enrolled embedding in ONE contiguous, L2-normalised float32 matrix.
+
+    A person's embeddings occupy a contiguous block of rows (offsets[i] ..
+    offsets[i] + counts[i]), so a match is one matrix-vector product followed by
+    a per-person max via np.maximum.reduceat — no Python loop, no per-call norms.
+
+    State is copy-on-write: writers build new arrays and swap them in under the
+    lock, readers take a consistent snapshot without locking. A match running
+    while someone is enrolled or deleted simply sees the gallery as it was.
+
+    Lookups go through a pluggable index (face_index): the exact scan for
+    normal galleries, an IVF index for building-scale ones. It is kept in step
+    with every add / delete and persisted at index_path.
+
+    On disk (save/load) the matrix is a raw .npy that is memory-mapped back, so
+    startup reads no embedding data at all; a small JSON manifest holds the
+    names and row ranges and is the atomic commit point of every write.
+    """
+
+    def __init__(self, dim=512, index_backend='auto', index_path=None):
+        self.dim = dim
+        self.index_backend = index_backend
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._saved = None  # (matrix object, file name, dtype) last written / mapped
+        # (names tuple, matrix (N, dim) float32, offsets (P,) int64, counts (P,) int64,
+        #  index) — swapped as one tuple so the index always matches the matrix.
+        self._state = ((), np.zeros((0, dim), np.float32),
+                       np.zeros(0, np.int64), np.zeros(0, np.int64), ExactIndex())
+
+    # ------------------------------------------------------------- reading
+
+    def snapshot(self):
+        return self._state
+
+    @property
+    def index(self):
+        return self._state[4]
+
+    @property
+    def names(self):
+        return list(self._state[0])
+
+    def __len__(self):
+        return len(self._state[0])
+
+    def __contains__(self, name):
+        return name in self._state[0]
+
+    @property
+    def rows(self):
+        return self._state[1].shape[0]
+
+    def counts(self):
+        return [int(c) for c in self._state[3]]
+
+    def embeddings(self, i, state=None):
+        names, matrix, offsets, counts, _ = state or self._state
+        return matrix[offsets[i]:offsets[i] + counts[i]]
+
+    def person_scores(self, embedding, state=None):
+        """Cosine similarity of `embedding` to each person (max over their rows)."""
+        names, matrix, offsets, counts, _ = state or self._state
+        if not names:
+            return np.zeros(0, np.float32)
+        sims = matrix @ normalize(embedding)
+        scores = np.full(len(names), -np.inf, np.float32)
+        has = counts > 0
+        if has.any():
+            scores[has] = np.maximum.reduceat(sims, offsets[has])
+        return scores
+
+    def best(self, embedding):
+        """(name, similarity) of the closest person, or None if the gallery is empty."""
+        state = self._state
+        index = state[4]
+        if index.kind == 'exact':
+            scores = self.person_scores(embedding, state)
+            if scores.size == 0:
+                return None
+            i = int(np.argmax(scores))
+            if not np.isfinite(scores[i]):
+                return None
+            return state[0][i], float(scores[i])
+        # Approximate: the best row found decides the person (its score IS that
+        # person's max over the rows searched).
+        names, matrix, offsets, _, _ = state
+        rows, sims = index.search(matrix, normalize(embedding))
+        if rows.size == 0:
+            return None
+        j = int(np.argmax(sims))
+        i = int(np.searchsorted(offsets, rows[j], side='right')) - 1
+        return names[i], float(sims[j])
+
+    def row_person(self, state=None):
+        """Person index of every row."""
+        names, matrix, offsets, counts, _ = state or self._state
+        return np.repeat(np.arange(len(names)), counts)
+
+    def index_report(self, queries=200, noise=0.3, seed=0):
+        """Index stats plus recall against the exact scan, measured on noisy
+        copies of enrolled embeddings (a stand-in for live captures)."""
+        state = self._state
+        index = state[4]
+        report = index.stats()
+        report['rows'] = int(state[1].shape[0])
+        if index.kind == 'exact' or state[1].shape[0] == 0:
+            return report
+        rng = np.random.default_rng(seed)
+        rows = state[1][rng.choice(state[1].shape[0], min(queries, state[1].shape[0]), replace=False)]
+        q = normalize(rows + rng.standard_normal(rows.shape).astype(np.float32) * noise / np.sqrt(self.dim))
+        report.update(measure_recall(index, state[1], self.row_person(state), q))
+        return report
+
+    # ------------------------------------------------------------- writing
+
+    def _swap(self, names, matrix, counts, index):
+        counts = np.asarray(counts, dtype=np.int64)
+        offsets = np.zeros(len(counts), np.int64)
+        if len(counts) > 1:
+            np.cumsum(counts[:-1], out=offsets[1:])
+        self._state = (tuple(names), matrix, offsets, counts, index)
+
+    def _reindexed(self, index, matrix):
+        """Switch backend when the gallery crosses the ANN threshold, or refit."""
+        want = wants_ann(self.index_backend, matrix.shape[0])
+        if want != (index.kind != 'exact') or index.stale(matrix.shape[0]):
+            return build_index(matrix, self.index_backend)
+        return index
+
+    def save_index(self):
+        if self.index_path:
+            state = self._state
+            state[4].save(self.index_path, state[1])
+
+    def set(self, names, encodings):
+        """Replace everything. encodings: per-person lists of embeddings."""
+        blocks = [normalize(np.reshape(e, (-1, self.dim))) for e in encodings]
+        matrix = np.concatenate(blocks) if blocks else np.zeros((0, self.dim), np.float32)
+        matrix = np.ascontiguousarray(matrix, np.float32)
+        index = build_index(matrix, self.index_backend, self.index_path)
+        with self._lock:
+            self._swap(names, matrix, [len(b) for b in blocks], index)
+
+    def set_normalized(self, names, matrix, counts):
+        """Replace everything with rows that are already unit-length float32
+        (e.g. a memory-mapped saved gallery) — no copy, no renormalisation."""
+        index = build_index(matrix, self.index_backend, self.index_path)
+        with self._lock:
+            self._swap(names, matrix, counts, index)
+
+    def add(self, name, embeddings):
+        """Append a new person; only their rows are normalised."""
+        rows = normalize(np.reshape(embeddings, (-1, self.dim)))
+        with self._lock:
+            names, matrix, _, counts, index = self._state
+            first = matrix.shape[0]
+            matrix = np.concatenate([matrix, rows])
+            index = self._reindexed(index.added(matrix, first), matrix)
+            self._swap(names + (name,), matrix, np.append(counts, len(rows)), index)
+
+    def rename(self, old, new):
+        """Names only — the matrix is untouched."""
+        with self._lock:
+            names, matrix, _, counts, index = self._state
+            names = tuple(new if n == old else n for n in names)
+            self._swap(names, matrix, counts, index)
+
+    def delete(self, name):
+        """Drop a person's row block. Returns False if unknown."""
+        with self._lock:
+            names, matrix, offsets, counts, index = self._state
+            if name not in names:
+                return False
+            i = names.index(name)
+            start, stop = offsets[i], offsets[i] + counts[i]
+            matrix = np.concatenate([matrix[:start], matrix[stop:]])
+            index = self._reindexed(index.removed(int(start), int(stop)), matrix)
+            self._swap(names[:i] + names[i + 1:], matrix, np.delete(counts, i), index)
+            return True
+
+    # ------------------------------------------------------------- storage
+
+    def save(self, manifest_path, dtype='float32'):
+        """Write the matrix (only if it changed since the last save/load) and
+        then the manifest, each via tmp + rename. The manifest names the matrix
+        file, so a crash at any point leaves the previous gallery intact."""
+        with self._save_lock:
+            names, matrix, offsets, counts, _ = self._state
+            folder = os.path.dirname(manifest_path) or '.'
+            stem = os.path.basename(manifest_path).split('.')[0]
+            old_file = self._saved[1] if self._saved else None
+            if self._saved is not None and self._saved[0] is matrix and self._saved[2] == dtype:
+                matrix_file = old_file  # rename: the rows didn't move
+            else:
+                gen = time.time_ns() // 1000
+                matrix_file = f'{stem}.{gen}.npy'
+                path = os.path.join(folder, matrix_file)
+                with open(path + '.tmp', 'wb') as f:
+                    np.save(f, np.asarray(matrix, dtype=dtype))
+                os.replace(path + '.tmp', path)
+            manifest = {
+                'version': 1,
+                'dim': self.dim,
+                'dtype': dtype,
+                'matrix': matrix_file,
+                'rows': int(matrix.shape[0]),
+                'people': [{'name': n, 'start': int(o), 'count': int(c)}
+                           for n, o, c in zip(names, offsets, counts)],
+            }
+            with open(manifest_path + '.tmp', 'w') as f:
+                json.dump(manifest, f)
+            os.replace(manifest_path + '.tmp', manifest_path)
+            self._saved = (matrix, matrix_file, dtype)
+            if old_file and old_file != matrix_file:
+                try:
+                    os.remove(os.path.join(folder, old_file))
+                except OSError:
+                    pass
+        return len(names)
+
+    def load(self, manifest_path):
+        """Map a saved gallery back in. float32 matrices are used straight from
+        the page cache (np.load mmap); float16 ones are widened into RAM."""
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+        folder = os.path.dirname(manifest_path) or '.'
+        matrix = np.load(os.path.join(folder, manifest['matrix']), mmap_mode='r')
+        people = manifest['people']
+        if (matrix.shape[0] != manifest['rows'] or sum(p['count'] for p in people) != matrix.shape[0]
+                or (matrix.shape[0] and matrix.shape[1] != self.dim)):
+            raise ValueError(f'{manifest["matrix"]} has shape {matrix.shape}, '
+                             f'manifest expects {manifest["rows"]} x {self.dim}')
+        if matrix.dtype != np.float32:
+            matrix = np.asarray(matrix, dtype=np.float32)
+        self.set_normalized([p['name'] for p in people], matrix, [p['count'] for p in people])
+        self._saved = (self._state[1], manifest['matrix'], manifest.get('dtype', 'float32'))
+        return len(people)
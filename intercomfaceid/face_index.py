@@ -0,0 +1,209 @@
+import logging
+import os
+import time
+
+import numpy as np
+
+# Below this many rows the exact scan is already sub-millisecond; an IVF index
+# only pays off for building-scale galleries.
+ANN_MIN_ROWS = 20000
+SEARCH_K = 32        # rows fetched per query before the per-person reduction
+KMEANS_ITERS = 10
+KMEANS_TRAIN_MAX = 50000
+ASSIGN_BATCH = 8192  # rows per batch when assigning to centroids (bounds memory)
+
+
+def _checksum(matrix):
+    """Cheap fingerprint tying a persisted index to the gallery it was built on."""
+    if matrix.shape[0] == 0:
+        return 0.0
+    step = max(1, matrix.shape[0] // 1024)
+    return float(np.asarray(matrix[::step], dtype=np.float64).sum())
+
+
+class ExactIndex:
+    """Brute force: one matrix-vector product over every row. Always correct."""
+
+    kind = 'exact'
+
+    def search(self, matrix, q, k=SEARCH_K):
+        """Top-k (rows, sims) of unit vector q against the row-normalised matrix."""
+        sims = matrix @ q
+        k = min(k, sims.shape[0])
+        if k == 0:
+            return np.zeros(0, np.int64), np.zeros(0, np.float32)
+        top = np.argpartition(-sims, k - 1)[:k]
+        return top, sims[top]
+
+    def added(self, matrix, first_row):
+        return self
+
+    def removed(self, start, stop):
+        return self
+
+    def save(self, path, matrix):
+        if os.path.exists(path):
+            os.remove(path)  # a leftover IVF file would no longer match
+
+    def stale(self, rows):
+        return False
+
+    def stats(self):
+        return {'kind': self.kind}
+
+
+class IVFIndex:
+    """Inverted-file index: spherical k-means centroids, each owning a list of
+    gallery rows. A query scores the centroids, then only the rows in the
+    nprobe closest lists — roughly nprobe/nlist of the exact cost.
+
+    Instances are immutable: added()/removed() return a new index sharing the
+    centroids, so a search racing an enrollment always sees a consistent view
+    (same copy-on-write rule as FaceGallery).
+    """
+
+    kind = 'ivf'
+
+    def __init__(self, centroids, lists, nprobe, trained_rows=0):
+        self.centroids = centroids       # (nlist, dim) float32, unit rows
+        self.lists = tuple(lists)        # per-centroid int64 row ids
+        self.nprobe = nprobe
+        self.trained_rows = trained_rows  # gallery size the centroids were fit on
+
+    @classmethod
+    def build(cls, matrix, nlist=None, nprobe=None, seed=0):
+        n = matrix.shape[0]
+        nlist = nlist or max(1, int(np.sqrt(n)))
+        nprobe = nprobe or max(4, nlist // 8)
+        rng = np.random.default_rng(seed)
+        train = matrix[rng.choice(n, min(n, KMEANS_TRAIN_MAX), replace=False)]
+        centroids = train[rng.choice(train.shape[0], nlist, replace=False)].copy()
+        for _ in range(KMEANS_ITERS):
+            assign = np.argmax(train @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, train)
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            empty = norms[:, 0] == 0
+            # Re-seed empty clusters from random training rows.
+            sums[empty] = train[rng.choice(train.shape[0], int(empty.sum()))]
+            centroids = sums / np.maximum(np.linalg.norm(sums, axis=1, keepdims=True), 1e-12)
+        index = cls(centroids.astype(np.float32), [np.zeros(0, np.int64)] * nlist, nprobe, n)
+        return index.added(matrix, 0)
+
+    def _assign(self, rows):
+        out = np.empty(rows.shape[0], np.int64)
+        for i in range(0, rows.shape[0], ASSIGN_BATCH):
+            out[i:i + ASSIGN_BATCH] = np.argmax(rows[i:i + ASSIGN_BATCH] @ self.centroids.T, axis=1)
+        return out
+
+    def added(self, matrix, first_row):
+        """New index with matrix[first_row:] appended to their nearest lists."""
+        rows = matrix[first_row:]
+        if rows.shape[0] == 0:
+            return self
+        assign = self._assign(rows)
+        ids = np.arange(first_row, matrix.shape[0], dtype=np.int64)
+        lists = list(self.lists)
+        for c in np.unique(assign):
+            lists[c] = np.concatenate([lists[c], ids[assign == c]])
+        return IVFIndex(self.centroids, lists, self.nprobe, self.trained_rows)
+
+    def removed(self, start, stop):
+        """New index without rows [start, stop); later row ids shift down."""
+        width = stop - start
+        lists = []
+        for ids in self.lists:
+            keep = ids[(ids < start) | (ids >= stop)]
+            lists.append(np.where(keep >= stop, keep - width, keep))
+        return IVFIndex(self.centroids, lists, self.nprobe, self.trained_rows)
+
+    def search(self, matrix, q, k=SEARCH_K):
+        probe = np.argpartition(-(self.centroids @ q), min(self.nprobe, len(self.lists)) - 1)
+        probe = probe[:self.nprobe]
+        cand = np.concatenate([self.lists[c] for c in probe])
+        if cand.size == 0:
+            return cand, np.zeros(0, np.float32)
+        sims = matrix[cand] @ q
+        k = min(k, sims.shape[0])
+        top = np.argpartition(-sims, k - 1)[:k]
+        return cand[top], sims[top]
+
+    def save(self, path, matrix):
+        sizes = np.array([len(ids) for ids in self.lists], np.int64)
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, centroids=self.centroids, ids=np.concatenate(self.lists),
+                 sizes=sizes, nprobe=self.nprobe, trained_rows=self.trained_rows,
+                 rows=matrix.shape[0], checksum=_checksum(matrix))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, matrix):
+        """The persisted index, or None if missing / built on a different gallery."""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as d:
+                if int(d['rows']) != matrix.shape[0] or not np.isclose(float(d['checksum']), _checksum(matrix)):
+                    logging.info('Face index is stale, rebuilding.')
+                    return None
+                bounds = np.concatenate([[0], np.cumsum(d['sizes'])])
+                ids = d['ids']
+                lists = [ids[bounds[i]:bounds[i + 1]] for i in range(len(d['sizes']))]
+                return cls(d['centroids'], lists, int(d['nprobe']), int(d['trained_rows']))
+        except Exception as e:
+            logging.warning(f'Could not load face index {path}: {e}')
+            return None
+
+    def stale(self, rows):
+        """Centroids fit on a much smaller gallery give lopsided lists — refit."""
+        return rows >= 2 * max(self.trained_rows, 1)
+
+    def stats(self):
+        sizes = [len(ids) for ids in self.lists]
+        return {'kind': self.kind, 'nlist': len(sizes), 'nprobe': self.nprobe,
+                'largest_list': max(sizes) if sizes else 0, 'trained_rows': self.trained_rows}
+
+
+def wants_ann(backend, rows):
+    """exact | ivf | auto (ivf once the gallery reaches ANN_MIN_ROWS rows)."""
+    if rows == 0 or backend == 'exact':
+        return False
+    return backend == 'ivf' or rows >= ANN_MIN_ROWS
+
+
+def build_index(matrix, backend='auto', path=None):
+    """The index `backend` calls for. An IVF index persisted at `path` is
+    reused if it still fits the matrix."""
+    if not wants_ann(backend, matrix.shape[0]):
+        return ExactIndex()
+    index = IVFIndex.load(path, matrix) if path else None
+    if index is None:
+        t0 = time.time()
+        index = IVFIndex.build(matrix)
+        logging.info(f'Built IVF face index over {matrix.shape[0]} rows in {time.time() - t0:.1f}s '
+                     f'(nlist {len(index.lists)}, nprobe {index.nprobe})')
+    return index
+
+
+def measure_recall(index, matrix, row_person, queries, k=SEARCH_K):
+    """Fraction of queries whose best PERSON under `index` equals the exact
+    scan's best person (what decides an unlock), plus mean search latency."""
+    exact = ExactIndex()
+    hits = 0
+    t_exact = t_index = 0.0
+    for q in queries:
+        t0 = time.perf_counter()
+        er, es = exact.search(matrix, q, 1)
+        t1 = time.perf_counter()
+        ar, asim = index.search(matrix, q, k)
+        t_index += time.perf_counter() - t1
+        t_exact += t1 - t0
+        if ar.size and row_person[ar[int(np.argmax(asim))]] == row_person[er[0]]:
+            hits += 1
+    n = max(len(queries), 1)
+    return {
+        'recall': round(hits / n, 4),
+        'queries': len(queries),
+        'exact_ms': round(t_exact / n * 1000, 3),
+        'index_ms': round(t_index / n * 1000, 3),
+    }
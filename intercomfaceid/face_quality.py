@@ -0,0 +1,83 @@
+import math
+
+import numpy as np
+
+WINDOW = 4          # candidates the live ranking looks back over
+TOP_K = 2           # a face is embedded if it ranks in the top K of the window
+GOOD_FACE_PX = 112  # face side (full-res px) at which size stops mattering: ArcFace's input
+SHARP_GOOD = 200.0  # crop Laplacian variance at which sharpness stops mattering
+MAX_YAW = 60.0      # degrees at which the pose term reaches 0
+MAX_PITCH = 45.0
+
+# ArcFace template (face_align): nose sits half way between eye line and mouth line.
+_NOSE_T = 0.5
+
+
+def pose(kps):
+    """(yaw, pitch) in degrees, estimated from SCRFD's five landmarks
+    (left eye, right eye, nose, left mouth, right mouth). Frontal = (0, 0).
+    Good to ±10° or so — enough to prefer a frontal face over a turned one."""
+    kps = np.asarray(kps, dtype=np.float32)
+    eye_mid = (kps[0] + kps[1]) / 2
+    mouth_mid = (kps[3] + kps[4]) / 2
+    half_eyes = np.linalg.norm(kps[1] - kps[0]) / 2
+    if half_eyes < 1e-3:
+        return 90.0, 0.0
+    # Yaw: how far the nose is off the face's vertical centre line.
+    centre_x = (eye_mid[0] + mouth_mid[0]) / 2
+    yaw = math.degrees(math.asin(float(np.clip((kps[2][0] - centre_x) / half_eyes, -1, 1))))
+    # Pitch: where the nose sits between the eye line and the mouth line.
+    span = mouth_mid[1] - eye_mid[1]
+    if abs(span) < 1e-3:
+        return yaw, 90.0
+    t = (kps[2][1] - eye_mid[1]) / span
+    pitch = math.degrees(math.asin(float(np.clip((t - _NOSE_T) / _NOSE_T, -1, 1))))
+    return yaw, pitch
+
+
+def quality(bbox, kps, sharpness):
+    """0..1 score of how useful a face crop is for recognition: detector
+    confidence x size x frontal pose x sharpness, each term capped at 1."""
+    det_score = float(bbox[4]) if len(bbox) > 4 else 1.0
+    side = min(bbox[2] - bbox[0], bbox[3] - bbox[1])
+    size = min(1.0, max(0.0, side) / GOOD_FACE_PX)
+    yaw, pitch = pose(kps)
+    frontal = max(0.0, 1 - abs(yaw) / MAX_YAW) * max(0.0, 1 - abs(pitch) / MAX_PITCH)
+    sharp = min(1.0, max(0.0, sharpness) / SHARP_GOOD)
+    return det_score * size * frontal * sharp
+
+
+class CandidateWindow:
+    """Streaming top-k filter over the quality of the last `size` candidates.
+
+    offer(score) decides on the spot — no frame is held back — whether this
+    face is worth an embedding: yes if it ranks in the top `k` of the window
+    (itself included). So a visitor walking up and improving is embedded
+    frame after frame, while a run of worse frames after a good one is
+    skipped. If `size` candidates in a row were turned down the next one is
+    taken anyway, so a steadily degrading view can't starve recognition.
+    """
+
+    def __init__(self, size=WINDOW, k=TOP_K):
+        self.size = size
+        self.k = k
+        self._scores = []
+        self._since_pick = 0
+        self.offered = 0
+        self.picked = 0
+
+    def offer(self, score):
+        self._scores.append(score)
+        if len(self._scores) > self.size:
+            del self._scores[0]
+        self.offered += 1
+        better = sum(1 for s in self._scores if s > score)
+        if better < self.k or self._since_pick >= self.size:
+            self._since_pick = 0
+            self.picked += 1
+            return True
+        self._since_pick += 1
+        return False
+
+    def stats(self):
+        return {'quality_offered': self.offered, 'quality_skipped': self.offered - self.picked}
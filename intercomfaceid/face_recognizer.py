@@ -1,6 +1,6 @@
 import numpy as np
-import insightface
 from insightface.utils import face_align
+import heapq
 import json
 import os
 import time
@@ -9,9 +9,22 @@ from datetime import datetime
 import logging
 import cv2
 
+from stream_manager import Frame
+from blur_calibration import BlurGate
+from face_quality import CandidateWindow, quality
+from face_gallery import FaceGallery, normalize
+from pipeline import Pipeline
+from face_tracker import FaceTracker
+from motion_gate import MotionGate
+from evidence import Evidence
+from job_scheduler import PRIORITY_BELL, PRIORITY_USER
+import model_loader
+
 MATCH_THRESHOLD = 0.50   # buffalo_sc cosine similarity to accept a match (0–1)
-REQUIRED_MATCHES = 2     # consecutive live frames that must match the SAME person
-                         # before unlocking — guards against single-frame false hits
+                         # How MANY frames must agree is decided by evidence.Evidence:
+                         # one at a very high score, several just above the threshold.
+RECORD_TRACES   = True   # append each session's similarity trace to
+                         # /data/similarity_traces.jsonl (replay: bench.py sprt)
 DEDUP_THRESHOLD = 0.70   # during enrollment, skip embeddings more similar than this
 BLUR_THRESHOLD  = 80.0   # Laplacian variance on the face crop; below this = "blurry".
                          # Gates the EXPENSIVE embedding step — detection still runs.
@@ -20,58 +33,325 @@ FORCE_AFTER_MS  = 100    # failsafe: if no frame has been embedded in this long,
                          # never starved. At 7 FPS this means ~every detected face is
                          # embedded; raise it (and BLUR_THRESHOLD) once calibration data
                          # shows where real matches cluster.
+BLUR_MIN_THRESHOLD = 20.0   # bounds for the self-calibrated threshold (p5 sharpness of
+BLUR_MAX_THRESHOLD = 200.0  # all matched faces so far, see BlurCalibration)
+BLUR_MIN_MATCHES   = 30     # matched samples needed before the threshold self-adjusts
+FORCE_AFTER_CALIBRATED_MS = 500  # failsafe once calibrated: the gate may then really skip
+RANK_FACES      = True   # embed only faces ranking in the top face_quality.TOP_K of the
+                         # last face_quality.WINDOW (score x size x pose x sharpness)
+LEARN_KEEP      = 12     # enrollment embeds only the best-quality N faces it saw
+INDEX_BACKEND   = 'auto' # gallery lookup: 'exact' scan, 'ivf' (approximate), or 'auto'
+                         # = exact until the gallery reaches face_index.ANN_MIN_ROWS rows
+TRACK_FACES     = True   # detect in an ROI around the last face between full-frame passes
+MOTION_GATE     = True   # reuse the last detection while a thumbnail diff says nothing moved
+ROI_DET_SIZE    = 160    # SCRFD input side for ROI passes (multiple of 32; full pass uses 320)
+PIPELINE_DEPTH  = 4      # frames detection may run ahead of embedding (bounded queue).
+                         # Only fills while ArcFace is the bottleneck, and is then what
+                         # it batches from: keep it >= EMBED_BATCH. 1 = no live batching.
+NO_FACE_TIMEOUT_S = 8    # end a session after this long without any face (0 = never)
+REJECTS_PER_TRACK = 3    # end it after this many confident Evidence rejects of ONE
+                         # tracked face — a stranger/courier standing at the door (0 = never)
+# A reject only counts towards that once the session is old enough for the
+# face to have settled, on a face good enough to judge, that never came close:
+# a resident still turning towards the camera scores just as low at first.
+REJECT_MIN_AGE_S  = 3.0  # seconds into the session
+REJECT_MIN_QUALITY = 0.3 # face_quality.quality of the frame that completed the reject
+REJECT_MAX_SIM  = MATCH_THRESHOLD - 0.1  # best similarity the rejected candidate reached
+ON_EARLY_END    = 'stop' # 'stop' the session, or drop to 'watch': WATCH_FPS detection for
+WATCH_FPS       = 1.0    # up to WATCH_MAX_S, back to full rate when a new face shows up
+WATCH_MAX_S     = 10.0   # a watch nobody new interrupts ends the session (with its reason)
+STANDBY_FPS     = 2.0    # standby watch (start_standby): frames looked at per second
+STANDBY_MOTION  = 4.0    # standby's MotionGate 'still' level (mean abs diff 0-255 of the
+                         # 32x24 thumbnail) — coarser than a session's, it runs all day
+IDENTITY_TTL_S  = 10.0   # a standby match unlocks on a bell for this long
+EMBED_BATCH     = 4      # max aligned crops per ArcFace call; the embed stage only
+                         # batches frames already waiting, so 1 frame never waits.
+                         # At most ~PIPELINE_DEPTH are ever waiting. Pick per board
+                         # from `bench.py embed` (or the benchmark's embed_batch table).
+GALLERY_DTYPE   = 'float32'  # on-disk embedding matrix. float32 is memory-mapped as-is;
+                             # 'float16' halves the file but is widened into RAM at load
+WARMUP          = True   # run a session's code paths once at start-up, before the first bell
+WARMUP_RESOLUTION = (1920, 1080)  # synthetic warm-up frame, used until a snapshot is stored
+WARMUP_ROUNDS   = 3      # warm passes timed after the cold one (median reported)
+MODEL_WAIT_S    = 180    # a bell / learn / benchmark arriving while buffalo_sc is still
+                         # loading (load_model=False start-up) waits this long for it
+
+
+def _pixels(frame):
+    """Full-resolution ndarray of a stream Frame (decoded on demand) or an image."""
+    return frame.image if isinstance(frame, Frame) else frame
+
+
+class _Work:
+    """One frame's trip through the recognition pipeline."""
+    __slots__ = ('frame', 'det', 'emb', 'best', 'match', 'detect_ms', 'embed_ms', 'track_id',
+                 'sharpness', 'quality', 'gate', 'prebell')
+
+    def __init__(self, frame, prebell=False):
+        self.frame = frame
+        self.det = self.emb = self.best = self.match = None
+        self.detect_ms = self.embed_ms = None
+        self.track_id = None
+        self.sharpness = self.quality = None
+        self.gate = None       # 'auto' / 'forced' / 'explore' = embed, None = skipped (blurry / outranked)
+        self.prebell = prebell # from the pre-bell buffer rather than live
 
 
 class FaceRecognizer:
     """buffalo_sc (InsightFace) only. Pipeline per frame:
         detect (SCRFD, ~cheap) -> face-crop blur gate -> embed (ArcFace, expensive)
     Detection runs on every frame; the costly embedding only runs on sharp frames.
-    SCRFD returns full-resolution landmarks, so the aligned recognition crop is taken
-    from the full-res frame (best embedding quality) while detection stays cheap."""
-
-    def __init__(self, stream_manager, event_logger=None, blur_calibration=None):
-        self.FACE_DATA_FILE = '/config/faces_data.json'
-        self.known_face_encodings = []
-        self.known_face_names = []
+    The blur threshold calibrates itself from BlurCalibration's match histogram.
+    Detection sees a DCT-reduced decode of the JPEG (SCRFD shrinks to det_size
+    anyway); its landmarks are mapped back to full resolution, so the aligned
+    recognition crop is taken from the full-res frame (best embedding quality) and
+    the full decode is only paid for frames that actually contain a face."""
+
+    def __init__(self, stream_manager, event_logger=None, blur_calibration=None, load_model=True,
+                 model_variant='fp32'):
+        self.FACE_DATA_FILE = '/config/faces_data.json'   # legacy, migrated on first load
+        self.FACE_MANIFEST_FILE = '/config/faces_data.manifest.json'
+        self.FACE_INDEX_FILE = '/config/faces_index.npz'
+        # All enrolled embeddings as one normalised matrix (see FaceGallery),
+        # searched through an exact or IVF index persisted next to the face data.
+        self.gallery = FaceGallery(index_backend=INDEX_BACKEND, index_path=self.FACE_INDEX_FILE)
         self._lock = threading.Lock()
         self.stream_manager = stream_manager
         self.arduino = None
         self.mqtt_client = None
+        self.scheduler = None
         self.event_logger = event_logger
         self.blur_calibration = blur_calibration
+        self.blur_threshold = BLUR_THRESHOLD
+        self.force_after_ms = FORCE_AFTER_MS
+        self._refresh_blur_threshold()
         self._logged_res = False
-
+        # Standby watch (see start_standby): the last confirmed identity as
+        # (name, similarity, time.time()), and a flag raised while a bell/learn
+        # session owns the camera so standby stays out of its way.
+        self._identity = None
+        self._standby_thread = None
+        self._standby_stop = threading.Event()
+        self._session = threading.Event()
+        # Raised by cancel_session() (a JobScheduler cancel) to end the
+        # current capture / enrollment early.
+        self._cancel = threading.Event()
+        # Set once load_model() finished; with load_model=False the caller
+        # runs it (on a start-up thread) and sessions wait for it.
+        self.model_ready = threading.Event()
+        # Set with model_error when load_model() failed: waiting is pointless.
+        self.model_failed = threading.Event()
+        self.model_error = None
+        self._det = self._rec = None
+        self.model_variant = model_variant   # model_loader.VARIANTS (int8: quantize_models.py)
+        self.model_report = None
+
+        # ORT sizes its own thread pools per model (model_loader); OpenCV's
+        # pool is kept small so the two don't oversubscribe the cores.
         try:
-            cores = os.cpu_count() or 2
-            cv2.setNumThreads(cores)
-            logging.info(f'OpenCV thread count set to {cores}')
+            cv2.setNumThreads(model_loader.CV_THREADS)
+            logging.info(f'OpenCV thread count set to {model_loader.CV_THREADS}')
         except Exception as e:
             logging.warning(f'Could not set OpenCV thread count: {e}')
 
-        logging.info('Loading buffalo_sc...')
-        self._model = insightface.app.FaceAnalysis(name='buffalo_sc')
-        # det_size bounds detection cost regardless of input frame size.
-        self._model.prepare(ctx_id=0, det_size=(320, 320))
-        self._det = self._model.models['detection']
-        self._rec = self._model.models['recognition']
-
+        # The gallery doesn't need the model: faces are listed in the
+        # dashboard while buffalo_sc is still loading.
         self.load_face_data()
+        if load_model:
+            self.load_model()
+
+    def load_model(self):
+        logging.info(f'Loading buffalo_sc ({self.model_variant})...')
+        t0 = time.perf_counter()
+        # det_size bounds detection cost regardless of input frame size.
+        try:
+            det, rec, report = model_loader.load_models(det_size=(320, 320), variant=self.model_variant)
+        except Exception as e:
+            self.model_error = str(e)
+            self.model_failed.set()
+            raise
+        report['total_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+        self._det, self._rec = det, rec
+        self._det_side = max(det.input_size)
+        self.model_report = report
+        logging.info(f'buffalo_sc ready in {report["total_ms"]}ms — {model_loader.format_report(report)}')
+        if self.event_logger is not None:
+            self.event_logger.log('models_loaded', **report)
+        if WARMUP:
+            try:
+                report['warmup'] = self._warm_up()
+            except Exception as e:
+                logging.warning(f'Model warm-up failed: {e}')
+        self.model_ready.set()
+
+    def _warmup_jpeg(self):
+        """(JPEG bytes, source): the newest stored bell snapshot — the real
+        camera resolution and usually a face — else a synthetic frame."""
+        folder = self.event_logger.snapshots_dir if self.event_logger is not None else None
+        if folder and os.path.isdir(folder):
+            snaps = [f for f in os.listdir(folder) if f.endswith('.jpg')]
+            bells = [f for f in snaps if f.startswith('bell_')] or snaps
+            if bells:
+                newest = max(bells, key=lambda f: os.path.getmtime(os.path.join(folder, f)))
+                with open(os.path.join(folder, newest), 'rb') as f:
+                    return f.read(), f'snapshot {newest}'
+        w, h = WARMUP_RESOLUTION
+        rng = np.random.default_rng(0)
+        img = (np.linspace(0, 255, w, dtype=np.float32)[None, :, None]
+               + rng.normal(0, 12, (h, w, 3))).clip(0, 255).astype(np.uint8)
+        return cv2.imencode('.jpg', img)[1].tobytes(), 'synthetic'
+
+    def _warm_up(self):
+        """Run each step of a session once before the first bell: full-frame
+        and ROI detection (a second SCRFD input shape), reduced and full
+        decodes, single and batched embedding. ORT allocates per input shape
+        on first use, so without this the first ring pays for all of it.
+        Returns cold (first pass) and warm (median of WARMUP_ROUNDS) ms."""
+        jpeg, source = self._warmup_jpeg()
+        runs = []
+        det = None
+        for _ in range(1 + WARMUP_ROUNDS):
+            frame = Frame(jpeg, time.time())   # a new Frame each pass: nothing cached
+            t = {}
+            t0 = time.perf_counter()
+            det = self._detect(frame)
+            t['detect_ms'] = (time.perf_counter() - t0) * 1000
+            w, h = frame.size
+            side = max(2 * ROI_DET_SIZE, min(w, h) // 3)
+            t0 = time.perf_counter()
+            self._detect(frame, roi=((w - side) // 2, (h - side) // 2, (w + side) // 2, (h + side) // 2))
+            t['detect_roi_ms'] = (time.perf_counter() - t0) * 1000
+            t0 = time.perf_counter()
+            img = frame.image
+            t['decode_ms'] = (time.perf_counter() - t0) * 1000
+            if det is not None:
+                crop = self._align(frame, det[1])
+            else:
+                s = min(h, w)
+                crop = cv2.resize(img[(h - s) // 2:(h + s) // 2, (w - s) // 2:(w + s) // 2], (112, 112))
+            t0 = time.perf_counter()
+            self._embed_aligned([crop])
+            t['embed_ms'] = (time.perf_counter() - t0) * 1000
+            if EMBED_BATCH > 1:
+                t0 = time.perf_counter()
+                self._embed_aligned([crop] * EMBED_BATCH)
+                t['embed_batch_ms'] = (time.perf_counter() - t0) * 1000
+            runs.append(t)
+
+        cold = {k: round(v, 1) for k, v in runs[0].items()}
+        warm = {k: round(float(np.median([r[k] for r in runs[1:]])), 1) for k in cold} if len(runs) > 1 else {}
+        report = {'source': source, 'resolution': f'{w}x{h}', 'face_found': det is not None,
+                  'cold': cold, 'warm': warm}
+        logging.info(f'Warm-up on {source} ({w}x{h}): '
+                     + ', '.join(f'{k[:-3]} {cold[k]}→{warm.get(k)}ms' for k in cold))
+        if self.event_logger is not None:
+            self.event_logger.log('model_warmup', **report)
+        return report
+
+    def _await_model(self, what):
+        """True once the model is loaded; waits up to MODEL_WAIT_S for it.
+        False straight away if loading failed."""
+        if self.model_ready.is_set():
+            return True
+        if not self.model_failed.is_set():
+            logging.info(f'{what} waiting for the model to finish loading...')
+            deadline = time.time() + MODEL_WAIT_S
+            while not self.model_ready.wait(0.5):
+                if self._cancel.is_set():
+                    logging.info(f'{what} cancelled while waiting for the model.')
+                    return False
+                if self.model_failed.is_set() or time.time() >= deadline:
+                    break
+            else:
+                return True
+        if self.model_failed.is_set():
+            logging.error(f'Model failed to load ({self.model_error}), {what} abandoned.')
+        else:
+            logging.error(f'Model not loaded after {MODEL_WAIT_S}s, {what} abandoned.')
+        return False
 
     # ------------------------------------------------------------ detection / embedding
 
-    def _detect(self, frame):
+    def _detect(self, frame, roi=None):
         """Run SCRFD. Returns (bbox[x1,y1,x2,y2,score], kps[5,2]) of the largest
-        face, or None. Coordinates are in full-resolution frame space."""
-        bboxes, kpss = self._det.detect(frame, max_num=0, metric='default')
+        face, or None. Coordinates are in full-resolution frame space.
+        A stream Frame is detected on the smallest DCT-reduced decode whose long
+        side still covers det_size, then scaled back up.
+        roi (x1, y1, x2, y2, full-res coords, see FaceTracker) restricts the
+        search to that region at the small ROI_DET_SIZE detector input, cut
+        from the coarsest decode that keeps the ROI at least that big — but
+        never a finer one than the full pass uses: a full pass found the face
+        at that scale, and a finer decode would cost more than the ROI saves."""
+        if isinstance(frame, Frame):
+            size = frame.size
+            factor = frame.scale_for(self._det_side)
+            if roi is not None:
+                side = max(roi[2] - roi[0], roi[3] - roi[1])
+                factor = max(factor, next((f for f in (8, 4, 2) if side / f >= ROI_DET_SIZE), 1))
+            img = frame.reduced(factor)
+        else:
+            img = frame
+            size = None
+        if img is None:
+            return None
+        ih, iw = img.shape[:2]
+        size = size or (iw, ih)
+        sx, sy = size[0] / iw, size[1] / ih
+
+        ox = oy = 0
+        input_size = None
+        if roi is not None:
+            ox, oy = max(0, int(roi[0] / sx)), max(0, int(roi[1] / sy))
+            x2, y2 = min(iw, int(roi[2] / sx) + 1), min(ih, int(roi[3] / sy) + 1)
+            if x2 - ox < 16 or y2 - oy < 16:
+                return None
+            img = img[oy:y2, ox:x2]
+            input_size = (ROI_DET_SIZE, ROI_DET_SIZE)
+
+        bboxes, kpss = self._det.detect(img, input_size=input_size, max_num=0, metric='default')
         if bboxes is None or bboxes.shape[0] == 0:
             return None
         areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
         i = int(np.argmax(areas))
-        return bboxes[i], kpss[i]
+        bbox, kps = bboxes[i], kpss[i]
+        if (sx, sy) != (1.0, 1.0) or ox or oy:
+            bbox, kps = bbox.copy(), kps.copy()
+            bbox[[0, 2]] = (bbox[[0, 2]] + ox) * sx
+            bbox[[1, 3]] = (bbox[[1, 3]] + oy) * sy
+            kps[:, 0] = (kps[:, 0] + ox) * sx
+            kps[:, 1] = (kps[:, 1] + oy) * sy
+        return bbox, kps
+
+    def _refresh_blur_threshold(self):
+        """Move the blur gate to the p5 matched floor once there is enough data."""
+        if self.blur_calibration is None:
+            return
+        t = self.blur_calibration.adaptive_threshold(BLUR_MIN_THRESHOLD, BLUR_MAX_THRESHOLD,
+                                                     BLUR_MIN_MATCHES)
+        if t is None:
+            return
+        if t != self.blur_threshold:
+            logging.info(f'Blur threshold {self.blur_threshold} -> {t} (p5 of matched faces)')
+        self.blur_threshold = t
+        self.force_after_ms = FORCE_AFTER_CALIBRATED_MS
+
+    def _tracker(self):
+        """A per-session FaceTracker, or None when tracking is off."""
+        return FaceTracker(self._detect) if TRACK_FACES else None
+
+    def _motion_gate(self, tracker):
+        """A per-session MotionGate in front of the tracker (or the plain
+        detector), or None when motion gating is off."""
+        if not MOTION_GATE:
+            return None
+        if tracker is not None:
+            return MotionGate(tracker.update, on_scene_change=tracker.reset)
+        return MotionGate(self._detect)
 
     def _crop_sharpness(self, frame, bbox):
         """Laplacian variance of the face crop only (reliable on a static camera,
         where a sharp background would otherwise mask a blurry face)."""
+        frame = _pixels(frame)
         x1, y1, x2, y2 = [int(v) for v in bbox[:4]]
         x1, y1 = max(0, x1), max(0, y1)
         x2 = min(x2, frame.shape[1])
@@ -83,12 +363,24 @@ class FaceRecognizer:
 
     def _embed(self, frame, kps):
         """Align the face from the full-res frame and run the ArcFace embedding."""
-        aligned = face_align.norm_crop(frame, landmark=kps, image_size=112)
-        feat = self._rec.get_feat(aligned)
-        return feat[0] if getattr(feat, 'ndim', 1) == 2 else feat
+        return self._embed_batch([(frame, kps)])[0]
+
+    def _embed_batch(self, faces):
+        """Embed several (frame, kps) faces — from consecutive frames or one
+        frame — in a single ArcFace call. Returns an (N, 512) array."""
+        return self._embed_aligned([self._align(f, k) for f, k in faces])
+
+    def _align(self, frame, kps):
+        """The 112x112 ArcFace crop, aligned on the full-res frame."""
+        return face_align.norm_crop(_pixels(frame), landmark=kps, image_size=112)
+
+    def _embed_aligned(self, crops):
+        feats = np.asarray(self._rec.get_feat(list(crops)))
+        return feats.reshape(len(crops), -1)
 
     def _face_crop_img(self, frame, bbox, pad=0.35):
         """A padded square-ish face crop for the gallery thumbnails."""
+        frame = _pixels(frame)
         x1, y1, x2, y2 = [int(v) for v in bbox[:4]]
         bw, bh = x2 - x1, y2 - y1
         px, py = int(bw * pad), int(bh * pad)
@@ -106,35 +398,40 @@ class FaceRecognizer:
         return self._sim(e1, e2)
 
     def _match(self, embedding):
-        with self._lock:
-            names = list(self.known_face_names)
-            encodings = list(self.known_face_encodings)
-        if not names:
+        return self._match_best(self.gallery.best(embedding))
+
+    def _match_best(self, best):
+        if best is None:
             return None
-        sims = [max(self._sim(embedding, e) for e in embs) for embs in encodings]
-        best_idx = int(np.argmax(sims))
-        best_score = float(sims[best_idx])
-        if best_score >= MATCH_THRESHOLD:
-            return {'name': names[best_idx], 'similarity': best_score}
+        name, score = best
+        if score >= MATCH_THRESHOLD:
+            return {'name': name, 'similarity': score}
         return None
 
     # ---------------------------------------------------------------- storage
 
     def save_face_data(self):
-        with self._lock:
-            data = {
-                'names': list(self.known_face_names),
-                'encodings': [[e.tolist() for e in embs] for embs in self.known_face_encodings],
-            }
-        with open(self.FACE_DATA_FILE, 'w') as f:
-            json.dump(data, f)
-        logging.info(f'Saved {len(data["names"])} faces to {self.FACE_DATA_FILE}')
+        n = self.gallery.save(self.FACE_MANIFEST_FILE, dtype=GALLERY_DTYPE)
+        self.gallery.save_index()
+        logging.info(f'Saved {n} faces to {self.FACE_MANIFEST_FILE}')
 
     def load_face_data(self):
+        if os.path.exists(self.FACE_MANIFEST_FILE):
+            t0 = time.time()
+            n = self.gallery.load(self.FACE_MANIFEST_FILE)
+            logging.info(f'Loaded {n} faces ({self.gallery.rows} embeddings, memory-mapped) '
+                         f'in {(time.time() - t0) * 1000:.0f}ms')
+            self._report_index()
+            return
         if not os.path.exists(self.FACE_DATA_FILE):
             logging.info('No face data file, starting empty.')
             self.save_face_data()
             return
+        self._migrate_json_face_data()
+
+    def _migrate_json_face_data(self):
+        """One-off: parse the legacy faces_data.json, write the binary gallery,
+        and keep the JSON next to it as *.migrated."""
         with open(self.FACE_DATA_FILE, 'r') as f:
             data = json.load(f)
 
@@ -156,12 +453,18 @@ class FaceRecognizer:
             names, encodings = keep_n, keep_e
 
         with self._lock:
-            self.known_face_names = names
-            self.known_face_encodings = encodings
-        logging.info(f'Loaded {len(names)} faces' +
+            self.gallery.set(names, encodings)
+        logging.info(f'Loaded {len(names)} faces from {self.FACE_DATA_FILE}' +
                      (f' (dropped {dropped} incompatible SFace entries — re-enroll them)' if dropped else ''))
-        if dropped:
-            self.save_face_data()  # rewrite without model_types / sface entries
+        self.save_face_data()
+        os.replace(self.FACE_DATA_FILE, self.FACE_DATA_FILE + '.migrated')
+        logging.info(f'Migrated face data to {self.FACE_MANIFEST_FILE}')
+        self._report_index()
+
+    def _report_index(self):
+        if self.gallery.index.kind != 'exact':
+            logging.info(f'Face index: {self.gallery.index_report()}')
+            self.gallery.save_index()
 
     # ------------------------------------------------------------ wiring
 
@@ -177,22 +480,163 @@ class FaceRecognizer:
         if self.mqtt_client:
             self.mqtt_client.publish_face_recognized(name)
 
+    # ---------------------------------------------------------------- jobs
+
+    def set_scheduler(self, scheduler):
+        self.scheduler = scheduler
+
+    def _submit(self, kind, fn, priority, key=None):
+        """Run fn on the JobScheduler's worker (one job per key — default the
+        kind — at a time: repeats coalesce into the queued/running one).
+        Without a scheduler it runs inline, as before. The cancel flag is
+        cleared as the job starts, so a cancel that arrives while it is still
+        waiting (e.g. for the model) does stop it."""
+        def run():
+            self._cancel.clear()
+            return fn()
+        if self.scheduler is None:
+            run()
+            return None
+        return self.scheduler.submit(kind, run, priority=priority, key=key or kind,
+                                     on_cancel=self.cancel_session)
+
+    def request_capture(self, priority=PRIORITY_BELL, capture_time=30, run_recognition=True, rang_at=None):
+        """rang_at: time.time() the bell was read, to time the session against."""
+        return self._submit('recognize', lambda: self.captureFace(capture_time, run_recognition, rang_at),
+                            priority)
+
+    def request_learn(self, person_name=None, priority=PRIORITY_USER):
+        # Keyed by name: a second learn for someone else is a job of its own,
+        # not folded into (and lost in) the queued one.
+        return self._submit('learn', lambda: self.learn_new_face(person_name), priority,
+                            key=f'learn:{person_name}' if person_name else 'learn')
+
+    def request_benchmark(self, priority=PRIORITY_USER):
+        return self._submit('benchmark', self.benchmark, priority)
+
     # --------------------------------------------------------- recognition
 
-    def captureFace(self, capture_time=30, run_recognition=True):
-        """Start the stream on demand, capture, then stop it again so the add-on
-        consumes no CPU decoding frames while idle."""
-        started_here = not self.stream_manager.is_capturing
-        if started_here:
-            logging.info('Starting video stream...')
-            if not self.stream_manager.start_video_stream():
-                logging.error('Failed to start video stream.')
-                return
+    def captureFace(self, capture_time=30, run_recognition=True, rang_at=None):
+        """Lease the stream for the capture. It connects on demand and is stopped
+        once nobody has used it for its linger period, so the add-on consumes
+        no CPU decoding frames while idle but back-to-back rings reuse the
+        connection. A fresh standby identity unlocks without any capture."""
+        if run_recognition and self._unlock_cached(rang_at):
+            return
+        # A bell during start-up sits in the job queue until buffalo_sc is up.
+        if run_recognition and not self._await_model('Recognition'):
+            return
+        self._session.set()
         try:
-            self._do_capture(capture_time, run_recognition)
+            with self.stream_manager.lease() as ok:
+                if not ok:
+                    logging.error('Failed to start video stream.')
+                    return
+                self._do_capture(capture_time, run_recognition, rang_at)
         finally:
-            if started_here:
-                self.stream_manager.stop_video_stream()
+            self._session.clear()
+
+    def cancel_session(self):
+        """Ask a running captureFace / learn_new_face to stop at the next frame."""
+        self._cancel.set()
+
+    def _unlock_cached(self, rang_at=None):
+        """Unlock straight away if standby confirmed someone within IDENTITY_TTL_S.
+        The identity is used once. Returns True if it unlocked."""
+        ident, self._identity = self._identity, None
+        if ident is None:
+            return False
+        name, similarity, at = ident
+        age = time.time() - at
+        if age > IDENTITY_TTL_S:
+            return False
+        self._unlock_and_publish(name)
+        logging.info(f'Recognized {name} {similarity*100:.1f}% from standby ({age:.1f}s ago)')
+        if self.event_logger is not None:
+            snapshot = None
+            ret, frame = self.stream_manager.get_latest(timeout=0)
+            if ret:
+                snapshot = self.event_logger.save_snapshot(frame.jpeg, prefix='bell')
+            self.event_logger.log('bell_ring', at=rang_at, snapshot=snapshot)
+            extra = {'bell_to_unlock_ms': round((time.time() - rang_at) * 1000)} if rang_at else {}
+            self.event_logger.log('face_recognized', name=name, similarity=round(similarity, 4),
+                                  model='buffalo_sc', snapshot=snapshot, cached=True,
+                                  cache_age_s=round(age, 1), end_reason='cached', **extra)
+        return True
+
+    # ------------------------------------------------------ standby watch
+
+    def start_standby(self):
+        """Opt-in: keep the stream leased and, at STANDBY_FPS, recognise whoever
+        is in front of the camera so a bell can unlock instantly (see
+        _unlock_cached). Detection only runs when the scene moved or a face is
+        present without a fresh identity, so an empty porch costs one tiny
+        reduced decode per frame."""
+        if self._standby_thread is not None:
+            return
+        self._standby_stop.clear()
+        self._standby_thread = threading.Thread(target=self._standby_loop, daemon=True, name='standby')
+        self._standby_thread.start()
+
+    def stop_standby(self):
+        self._standby_stop.set()
+        if self._standby_thread is not None:
+            self._standby_thread.join(timeout=5)
+            self._standby_thread = None
+
+    def _standby_loop(self):
+        while not self.model_ready.wait(1):
+            if self._standby_stop.is_set() or self.model_failed.is_set():
+                return
+        while not self._standby_stop.is_set():
+            with self.stream_manager.lease() as ok:
+                if ok:
+                    logging.info(f'Standby watch running at {STANDBY_FPS:g} FPS')
+                    self._standby_watch()
+                    continue
+            logging.error('Standby watch could not start the stream, retrying in 30s.')
+            self._standby_stop.wait(30)
+
+    def _standby_watch(self):
+        interval = 1.0 / STANDBY_FPS
+        seq = 0
+        motion = MotionGate(self._detect, still=STANDBY_MOTION)
+        evidence = Evidence()
+        while not self._standby_stop.is_set():
+            ret, frame = self.stream_manager.get_latest(newer_than=seq, timeout=2)
+            if not self.stream_manager.is_capturing:
+                return          # stream dropped: re-lease
+            if not ret:
+                continue
+            seq = frame.seq
+            if self._session.is_set():
+                # A bell or enrollment owns the camera right now.
+                motion.reset()
+                evidence.reset()
+                self._standby_stop.wait(interval)
+                continue
+            try:
+                det = motion.update(frame)
+                if det is None:
+                    if not motion.reused:
+                        evidence.miss()
+                elif not (motion.reused and self._identity_fresh()):
+                    best = self.gallery.best(self._embed(frame, det[1]))
+                    verdict = evidence.update(*best) if best is not None else None
+                    if verdict and verdict[0] == 'accept' and verdict[2] >= MATCH_THRESHOLD:
+                        if self._identity is None or self._identity[0] != verdict[1]:
+                            logging.info(f'Standby: {verdict[1]} at the door ({verdict[2]*100:.1f}%)')
+                        self._identity = (verdict[1], verdict[2], time.time())
+                        evidence.reset()
+            except Exception as e:
+                logging.error(f'Standby watch error: {e}')
+            finally:
+                frame.release()   # the ring's frames must not pin decoded pixels
+            self._standby_stop.wait(interval)
+
+    def _identity_fresh(self):
+        ident = self._identity
+        return ident is not None and time.time() - ident[2] <= IDENTITY_TTL_S / 2
 
     def capture_snapshot(self, prefix='signal'):
         """Grab a single LIVE frame and save it as a snapshot — no recognition,
@@ -200,46 +644,36 @@ class FaceRecognizer:
         activity log shows who's there. Returns the snapshot filename or None."""
         if self.event_logger is None:
             return None
-        started_here = not self.stream_manager.is_capturing
-        if started_here:
-            if not self.stream_manager.start_video_stream():
+        with self.stream_manager.lease() as ok:
+            if not ok:
                 logging.error('Failed to start video stream for snapshot.')
                 return None
-        try:
-            frame = None
-            wait_until = time.time() + 4
-            while time.time() < wait_until:
-                ret, f = self.stream_manager.get_frame()
-                if ret:
-                    frame = f
-                    break
-                time.sleep(0.05)
-            if frame is None:
+            # Peek, don't take: a recognition session may be consuming the ring.
+            ret, frame = self.stream_manager.get_latest(timeout=4)
+            if not ret:
                 logging.warning('Could not grab frame for signal snapshot.')
                 return None
-            return self.event_logger.save_snapshot(frame, prefix=prefix)
-        finally:
-            if started_here:
-                self.stream_manager.stop_video_stream()
-
-    def _do_capture(self, capture_time, run_recognition):
-        # Cold start: wait briefly for the first decoded frame after (re)connecting.
-        frame = None
-        wait_until = time.time() + 4
-        while time.time() < wait_until:
-            ret, f = self.stream_manager.get_frame()
-            if ret:
-                frame = f
-                break
-            time.sleep(0.05)
-        if frame is None:
-            logging.warning('Could not grab frame for snapshot.')
-            return
+            # Written straight from the stream's JPEG bytes — never decoded.
+            return self.event_logger.save_snapshot(frame.jpeg, prefix=prefix)
+
+    def _do_capture(self, capture_time, run_recognition, rang_at=None):
+        # Frames buffered before the bell (if the pre-bell buffer is on) are
+        # evaluated first, newest first: the visitor usually faced the camera
+        # right before pressing the button, not after.
+        backlog = self.stream_manager.get_history()
+        if backlog:
+            frame = backlog[0]
+        else:
+            # Cold start: wait briefly for the first frame after (re)connecting.
+            ret, frame = self.stream_manager.get_raw_frame(timeout=4)
+            if not ret:
+                logging.warning('Could not grab frame for snapshot.')
+                return
 
         snapshot_filename = None
         if self.event_logger is not None:
-            snapshot_filename = self.event_logger.save_snapshot(frame, prefix='bell')
-            self.event_logger.log('bell_ring', snapshot=snapshot_filename)
+            snapshot_filename = self.event_logger.save_snapshot(frame.jpeg, prefix='bell')
+            self.event_logger.log('bell_ring', at=rang_at, snapshot=snapshot_filename)
 
         if not run_recognition:
             return
@@ -247,89 +681,144 @@ class FaceRecognizer:
         if self.event_logger is not None:
             self.event_logger.log('recognition_started')
 
-        if not self._logged_res:
-            logging.info(f'Source frame resolution: {frame.shape[1]}x{frame.shape[0]}')
+        if not self._logged_res and frame.size is not None:
+            # From the JPEG header: no decode just to log it.
+            logging.info(f'Source frame resolution: {frame.size[0]}x{frame.size[1]}')
             self._logged_res = True
 
-        with self._lock:
-            have_faces = len(self.known_face_names) > 0
+        have_faces = len(self.gallery) > 0
         if not have_faces:
             logging.warning('No faces enrolled — nothing to recognize.')
             if self.event_logger is not None:
-                self.event_logger.log('face_denied', similarity=None, snapshot=snapshot_filename)
+                self.event_logger.log('face_denied', similarity=None, snapshot=snapshot_filename,
+                                      end_reason='no_gallery')
             return
 
         start_time = time.time()
+        if rang_at is not None:
+            # Job queueing + stream connect + first frame: what the visitor waits
+            # through before recognition even begins.
+            logging.info(f'Recognition started {(start_time - rang_at) * 1000:.0f}ms after the bell')
         fps_counter = 0
         fps_timer = time.time()
         detect_ms, detect_frames = 0.0, 0
         embed_ms, embed_frames = 0.0, 0
         no_face_frames = 0      # frames where SCRFD found no face
         match = None            # set only once a match is CONFIRMED (see below)
-        pending_name = None     # person matched on the previous frame
-        streak = 0              # consecutive frames matching pending_name
-
-        while time.time() - start_time < capture_time:
-            ret, frame = self.stream_manager.get_frame()
-            if not ret:
-                continue
-
-            fps_counter += 1
-            now = time.time()
-            if now - fps_timer >= 1.0:
-                logging.info(f'Recognition FPS: {fps_counter / (now - fps_timer):.1f}')
-                fps_counter = 0
-                fps_timer = now
-
-            # --- Detection (every frame) ---
-            try:
-                t0 = time.time()
-                det = self._detect(frame)
-                detect_ms += (time.time() - t0) * 1000
-                detect_frames += 1
-            except Exception as e:
-                logging.error(f'Detection error: {e}')
-                continue
-            if det is None:
-                no_face_frames += 1
-                pending_name = None   # a no-face frame breaks the streak
-                streak = 0
-                continue
-            bbox, kps = det
-
-            # --- Embedding + match (no blur gate — simple and reliable) ---
-            try:
-                t0 = time.time()
-                emb = self._embed(frame, kps)
-                embed_ms += (time.time() - t0) * 1000
-                embed_frames += 1
-                m = self._match(emb)
-            except Exception as e:
-                logging.error(f'Embedding error: {e}')
-                continue
-
-            # Require REQUIRED_MATCHES consecutive frames of the SAME person before
-            # accepting — a single-frame fluke can't unlock the door.
-            if m:
-                if m['name'] == pending_name:
-                    streak += 1
-                else:
-                    pending_name = m['name']
-                    streak = 1
-                if streak >= REQUIRED_MATCHES:
-                    match = m
-                    # Auto-refresh the person's gallery with this fresh face crop.
-                    if self.event_logger is not None:
-                        try:
-                            crop = self._face_crop_img(frame, bbox)
-                            if crop is not None:
-                                self.event_logger.add_face_image(crop, match['name'])
-                        except Exception as e:
-                            logging.debug(f'gallery update failed: {e}')
+        evidence = Evidence()   # accumulates per-frame similarities until confident
+        trace = []              # [ms since start, name, similarity] per frame (None = no face)
+        end_reason = 'timeout'  # match / no_face / rejected / timeout / cancelled
+        last_face = start_time
+        rejects = {}            # track id -> confident rejects of that face
+        # Pipeline source state: pre-bell backlog, then live frames newer than
+        # it; 'interval' throttles the live frames in watch mode.
+        source = {'interval': 0.0, 'last': 0.0, 'backlog': list(backlog),
+                  'after_seq': backlog[0].seq if backlog else 0}
+        prebell_frames = len(backlog)
+        matched_prebell = False
+        watch = None            # (reason, seconds in) once dropped to watch mode
+        watch_track = None
+
+        # Detection and embedding run on separate threads (see Pipeline): SCRFD
+        # works on frame N+1 while ArcFace embeds frame N, and when ArcFace
+        # falls behind it embeds the frames that queued up in one batch.
+        # Results come back in frame order, so the evidence sees them in order.
+        tracker = self._tracker()
+        motion = self._motion_gate(tracker)
+        gate = BlurGate(self.blur_threshold, self.force_after_ms)
+        window = CandidateWindow() if RANK_FACES else None
+        pipe = Pipeline(lambda: self._live_work(source),
+                        [('detect', lambda w: self._stage_detect(w, tracker, gate, window, motion)),
+                         ('embed', self._stage_embed, EMBED_BATCH)],
+                        depth=PIPELINE_DEPTH).start()
+        try:
+            while time.time() - start_time < capture_time:
+                if self._cancel.is_set():
+                    end_reason = 'cancelled'
                     break
-            else:
-                pending_name = None   # a non-matching face breaks the streak
-                streak = 0
+                early = None     # why the session should stop now, if it should
+                w = pipe.get(timeout=0.1)
+                now = time.time()
+                if w is not None:
+                    fps_counter += 1
+                    if now - fps_timer >= 1.0:
+                        logging.info(f'Recognition FPS: {fps_counter / (now - fps_timer):.1f}')
+                        fps_counter = 0
+                        fps_timer = now
+
+                    detect_ms += w.detect_ms
+                    detect_frames += 1
+                    t_ms = round((now - start_time) * 1000)
+                    if w.det is None:
+                        no_face_frames += 1
+                        evidence.miss()       # a dropped frame or two is tolerated
+                        trace.append([t_ms, None, None])
+                    else:
+                        last_face = now
+                        if watch is not None and w.track_id != watch_track:
+                            # Someone new in front of the camera: back to full rate.
+                            logging.info('New face in watch mode — resuming full-rate recognition')
+                            source['interval'] = 0.0
+                            watch = watch_track = None
+                            evidence.reset()
+
+                    if w.det is not None and w.gate is not None and w.best is not None:
+                        bbox, kps = w.det
+                        embed_ms += w.embed_ms
+                        embed_frames += 1
+                        gate.sample(w.sharpness, w.match, w.gate)
+                        trace.append([t_ms, w.best[0], round(w.best[1], 4)])
+
+                        # Accept only once the accumulated evidence for ONE person is
+                        # strong enough — a single-frame fluke can't unlock the door.
+                        verdict = evidence.update(*w.best)
+                        if verdict and verdict[0] == 'accept' and verdict[2] >= MATCH_THRESHOLD:
+                            match = {'name': verdict[1], 'similarity': verdict[2]}
+                            end_reason = 'match'
+                            matched_prebell = w.prebell
+                            # Auto-refresh the person's gallery with this fresh face crop.
+                            if self.event_logger is not None:
+                                try:
+                                    crop = self._face_crop_img(w.frame, bbox)
+                                    if crop is not None:
+                                        self.event_logger.add_face_image(crop, match['name'])
+                                except Exception as e:
+                                    logging.debug(f'gallery update failed: {e}')
+                            w.frame.release()
+                            break
+                        if (verdict and verdict[0] == 'reject'
+                                and now - start_time >= REJECT_MIN_AGE_S
+                                and w.quality >= REJECT_MIN_QUALITY
+                                and (verdict[2] is None or verdict[2] < REJECT_MAX_SIM)):
+                            n = rejects[w.track_id] = rejects.get(w.track_id, 0) + 1
+                            if REJECTS_PER_TRACK and n >= REJECTS_PER_TRACK:
+                                early = 'rejected'   # the same face, confidently not enrolled
+                    w.frame.release()   # done with its pixels
+
+                if early is None and NO_FACE_TIMEOUT_S and now - last_face >= NO_FACE_TIMEOUT_S:
+                    early = 'no_face'
+                if watch is not None:
+                    if now - start_time - watch[1] >= WATCH_MAX_S:
+                        end_reason = watch[0]
+                        break
+                    continue
+                if early is None:
+                    continue
+                if ON_EARLY_END != 'watch':
+                    end_reason = early
+                    break
+                watch = (early, round(now - start_time, 1))
+                watch_track = tracker.track_id if tracker is not None else None
+                source['interval'] = 1.0 / WATCH_FPS
+                last_face = now
+                evidence.reset()
+                logging.info(f'Recognition dropping to {WATCH_FPS:g} FPS watch mode ({early})')
+        finally:
+            pipe.stop()
+        if watch is not None and end_reason == 'timeout':
+            end_reason = watch[0]   # capture_time ran out while watching: that's why
+        if self.blur_calibration is not None:
+            self.blur_calibration.record_async(gate, on_done=self._refresh_blur_threshold)
 
         duration_s = round(time.time() - start_time, 1)
         timing = {
@@ -339,10 +828,34 @@ class FaceRecognizer:
             'embed_frames':  embed_frames,
             'no_face_frames': no_face_frames,
             'duration_s':   duration_s,
+            'stages':       pipe.stats(),   # per-stage latency + queue depth
+            **gate.stats(),
         }
+        if window is not None:
+            timing.update(window.stats())
+        timing['embeddings_saved'] = gate.skipped_blurry + timing.get('quality_skipped', 0)
+        if tracker is not None:
+            timing.update(tracker.stats())
+        if motion is not None:
+            timing.update(motion.stats())
+        timing.update(evidence.stats())
+        timing['end_reason'] = end_reason
+        if rang_at is not None:
+            timing['bell_to_start_ms'] = round((start_time - rang_at) * 1000)
+        if prebell_frames:
+            timing['prebell_frames'] = prebell_frames
+            timing['matched_prebell'] = matched_prebell
+        if watch is not None:
+            timing['watch_reason'], timing['watch_from_s'] = watch
+        if RECORD_TRACES and self.event_logger is not None:
+            self.event_logger.save_trace(trace, result=match['name'] if match else None,
+                                         snapshot=snapshot_filename)
 
         summary = (f'detect {timing["detect_avg_ms"]}ms×{detect_frames}f  '
-                   f'embed {timing["embed_avg_ms"]}ms×{embed_frames}f  (no_face {no_face_frames})')
+                   f'embed {timing["embed_avg_ms"]}ms×{embed_frames}f  (no_face {no_face_frames}, '
+                   f'saved {timing["embeddings_saved"]}: {gate.skipped_blurry} blurry @ {gate.threshold:g}, '
+                   f'{timing.get("quality_skipped", 0)} outranked)  '
+                   f'e2e {timing["stages"]["latency_avg_ms"]}ms  ended: {end_reason}')
 
         if match:
             logging.info(f'Recognized {match["name"]} {match["similarity"]*100:.1f}% — {summary}')
@@ -362,38 +875,111 @@ class FaceRecognizer:
                                       snapshot=snapshot_filename,
                                       **timing)
 
+    def _live_work(self, source=None):
+        """Pipeline source: the pre-bell backlog in source['backlog'] (newest
+        first), then the newest live frame. Live frames that piled up while
+        the detector was busy are stale and are dropped without ever being
+        decoded, as are live frames the backlog already covered. The frame
+        stays compressed here — _detect decodes it at reduced scale and _embed
+        only decodes full-res when a face was found.
+        source['interval'] > 0 throttles the live frames (watch mode)."""
+        if source is not None and source['backlog']:
+            return _Work(source['backlog'].pop(0), prebell=True)
+        if source and source['interval']:
+            wait = source['last'] + source['interval'] - time.time()
+            if wait > 0:
+                time.sleep(min(wait, 0.1))
+                return None
+        ret, frame = self.stream_manager.get_raw_frame(newest=True, timeout=0.1)
+        if not ret:
+            return None
+        if source is not None:
+            if frame.seq <= source['after_seq']:
+                return None
+            source['last'] = time.time()
+        return _Work(frame)
+
+    def _stage_detect(self, w, tracker=None, gate=None, window=None, motion=None):
+        t0 = time.time()
+        if motion is not None:
+            w.det = motion.update(w.frame)
+        elif tracker is not None:
+            w.det = tracker.update(w.frame)
+        else:
+            w.det = self._detect(w.frame)
+        if tracker is not None:
+            w.track_id = tracker.track_id
+        w.detect_ms = (time.time() - t0) * 1000
+        if w.det is not None:
+            bbox, kps = w.det
+            w.sharpness = self._crop_sharpness(w.frame, bbox)
+            w.quality = quality(bbox, kps, w.sharpness)
+            if window is not None and not window.offer(w.quality):
+                w.gate = None      # a better face was seen moments ago
+            else:
+                w.gate = gate.decide(w.sharpness) if gate is not None else 'auto'
+        return w
+
+    def _stage_embed(self, batch):
+        faces = [w for w in batch if w.gate is not None]
+        if faces:
+            t0 = time.time()
+            embs = self._embed_batch([(w.frame, w.det[1]) for w in faces])
+            per_face_ms = (time.time() - t0) * 1000 / len(faces)
+            for w, emb in zip(faces, embs):
+                w.emb = emb
+                w.embed_ms = per_face_ms   # amortised over the batch
+                w.best = self.gallery.best(emb)
+                w.match = self._match_best(w.best)
+        for w in batch:
+            if w.emb is None:
+                w.frame.release()   # no face to crop later: don't carry its pixels downstream
+        return batch
+
     # ---------------------------------------------------------- benchmark
 
     def benchmark(self, iterations=20):
         """Measure raw per-stage latency on live frames, as if a face were present.
         Detection runs on each frame; the embedding is forced on a synthetic crop
         when no real face is detected, so timing reflects the full pipeline."""
-        if not self.stream_manager.is_capturing:
-            self.stream_manager.start_video_stream()
-
+        if not self._await_model('Benchmark'):
+            return {'error': 'Model not loaded'}
+        with self.stream_manager.lease() as ok:
+            if not ok:
+                return {'error': 'Failed to start video stream'}
+            return self._benchmark(iterations)
+
+    def _benchmark(self, iterations):
         frames = []
         deadline = time.time() + 12
         while len(frames) < iterations and time.time() < deadline:
-            ret, frame = self.stream_manager.get_frame()
+            ret, frame = self.stream_manager.get_raw_frame(timeout=deadline - time.time())
             if ret:
                 frames.append(frame)
-            else:
-                time.sleep(0.05)
         if not frames:
             return {'error': 'No frames available from stream'}
 
-        h, w = frames[0].shape[:2]
+        w, h = frames[0].size
 
         def avg(lst):
             return round(sum(lst) / len(lst), 1) if lst else None
 
-        det_times, emb_times = [], []
+        dec_times, rdec_times, det_times, emb_times = [], [], [], []
         faces_detected = 0
+        factor = frames[0].scale_for(self._det_side)
+
+        for raw in frames:
+            # Time each decode on its own copy of the frame so caching can't hide it.
+            t = time.time()
+            f = Frame(raw.jpeg, raw.timestamp).image
+            dec_times.append((time.time() - t) * 1000)
+            t = time.time()
+            Frame(raw.jpeg, raw.timestamp).reduced(factor)
+            rdec_times.append((time.time() - t) * 1000)
 
-        for f in frames:
             fh, fw = f.shape[:2]
             t = time.time()
-            det = self._detect(f)
+            det = self._detect(raw)
             det_times.append((time.time() - t) * 1000)
 
             if det is not None:
@@ -412,30 +998,55 @@ class FaceRecognizer:
                 emb_times.append((time.time() - t) * 1000)
 
         d, e = avg(det_times), avg(emb_times)
+        batch = self._benchmark_batches(frames[0])
         result = {
             'frames': len(frames),
             'resolution': f'{w}x{h}',
             'faces_detected': faces_detected,
-            'detect_ms': d,
+            'decode_full_ms': avg(dec_times),
+            'decode_reduced_ms': avg(rdec_times),
+            'detect_scale': f'1/{factor}',
+            'detect_ms': d,   # includes the reduced decode, as in the live path
             'embed_ms': e,
             'total_ms': round((d or 0) + (e or 0), 1),
+            'embed_batch': batch,
         }
         logging.info(f'Benchmark: {result}')
         return result
 
+    def _benchmark_batches(self, frame, sizes=(1, 2, 4, 8), rounds=5):
+        """ArcFace throughput per batch size on crops of one real frame:
+        {size: {'ms': per call, 'per_face_ms', 'faces_per_s'}}."""
+        img = _pixels(frame)
+        h, w = img.shape[:2]
+        s = min(h, w)
+        crop = cv2.resize(img[(h - s) // 2:(h + s) // 2, (w - s) // 2:(w + s) // 2], (112, 112))
+        self._rec.get_feat([crop])  # warm-up: first call allocates the session buffers
+        out = {}
+        for n in sizes:
+            crops = [crop] * n
+            t = time.time()
+            for _ in range(rounds):
+                self._rec.get_feat(crops)
+            ms = (time.time() - t) * 1000 / rounds
+            out[n] = {'ms': round(ms, 1), 'per_face_ms': round(ms / n, 1),
+                      'faces_per_s': round(n * 1000 / ms, 1) if ms else None}
+        return out
+
     # ------------------------------------------------------- enrollment
 
     def learn_new_face(self, person_name=None):
-        started_here = not self.stream_manager.is_capturing
-        if started_here:
-            if not self.stream_manager.start_video_stream():
-                logging.error('Failed to start video stream.')
-                return
+        if not self._await_model('Enrollment'):
+            return
+        self._session.set()
         try:
-            self._do_learn(person_name)
+            with self.stream_manager.lease() as ok:
+                if not ok:
+                    logging.error('Failed to start video stream.')
+                    return
+                self._do_learn(person_name)
         finally:
-            if started_here:
-                self.stream_manager.stop_video_stream()
+            self._session.clear()
 
     def _do_learn(self, person_name=None):
         if person_name is None:
@@ -445,53 +1056,60 @@ class FaceRecognizer:
 
         start_time = time.time()
         session_embeddings = []
+        tracker = self._tracker()
+        motion = self._motion_gate(tracker)
+        # The LEARN_KEEP best faces by quality, as a min-heap of
+        # (quality, seq, aligned crop, thumbnail). Only the small crops are
+        # kept, never the frames, so holding them costs a few hundred KB.
+        candidates = []
+        seen = 0
 
         while time.time() - start_time < 5:
-            ret, frame = self.stream_manager.get_frame()
+            if self._cancel.is_set():
+                logging.info(f'Learning {person_name} cancelled')
+                return
+            ret, frame = self.stream_manager.get_raw_frame(timeout=start_time + 5 - time.time())
             if not ret:
-                time.sleep(0.1)
                 continue
             try:
-                det = self._detect(frame)
+                if motion is not None:
+                    det = motion.update(frame)
+                    if motion.reused:
+                        continue  # same picture as the last candidate: nothing new to enroll
+                elif tracker is not None:
+                    det = tracker.update(frame)
+                else:
+                    det = self._detect(frame)
                 if det is None:
                     continue
                 bbox, kps = det
-                if self._crop_sharpness(frame, bbox) < BLUR_THRESHOLD:
+                sharpness = self._crop_sharpness(frame, bbox)
+                if sharpness < self.blur_threshold:
                     continue  # don't enroll blurry frames
-                embedding = self._embed(frame, kps)
-
-                with self._lock:
-                    known = list(self.known_face_encodings)
-                    known_names = list(self.known_face_names)
-
-                # Skip if this already matches an enrolled person
-                is_known = False
-                for embs, mname in zip(known, known_names):
-                    if any(self._sim(embedding, e) > DEDUP_THRESHOLD for e in embs):
-                        logging.info(f'Matches existing {mname}, skipping frame.')
-                        is_known = True
-                        break
-                if is_known:
-                    continue
-
-                # Skip near-duplicates within this session
-                if any(self._sim(embedding, e) > DEDUP_THRESHOLD for e in session_embeddings):
+                q = quality(bbox, kps, sharpness)
+                seen += 1
+                if len(candidates) >= LEARN_KEEP and q <= candidates[0][0]:
                     continue
-                session_embeddings.append(embedding)
-                logging.info(f'Embedding #{len(session_embeddings)} for {person_name}')
-
-                # Seed the gallery with a crop from each accepted (diverse) frame
-                if self.event_logger is not None:
-                    crop = self._face_crop_img(frame, bbox)
-                    if crop is not None:
-                        self.event_logger.add_face_image(crop, person_name)
+                entry = (q, seen, self._align(frame, kps), self._face_crop_img(frame, bbox))
+                if len(candidates) < LEARN_KEEP:
+                    heapq.heappush(candidates, entry)
+                else:
+                    heapq.heapreplace(candidates, entry)
             except Exception as e:
                 logging.error(f'Error in learn_new_face: {e}')
+            finally:
+                frame.release()   # only the small crops are kept
+
+        # Best first, so the dedup below keeps the better of two similar faces.
+        candidates.sort(reverse=True)
+        logging.info(f'Enrolling from the best {len(candidates)} of {seen} sharp faces'
+                     + (f' ({motion.skip_count} unchanged frames skipped)' if motion is not None else ''))
+        for i in range(0, len(candidates), EMBED_BATCH):
+            self._learn_batch(candidates[i:i + EMBED_BATCH], session_embeddings, person_name)
 
         with self._lock:
             if session_embeddings:
-                self.known_face_encodings.append(session_embeddings)
-                self.known_face_names.append(person_name)
+                self.gallery.add(person_name, session_embeddings)
                 logging.info(f'Enrolled {person_name} ({len(session_embeddings)} embeddings)')
             else:
                 logging.warning(f'No embeddings collected for {person_name}')
@@ -500,34 +1118,63 @@ class FaceRecognizer:
         if self.arduino:
             self.arduino.unlock()
 
+    def _learn_batch(self, batch, session_embeddings, person_name):
+        """Embed a batch of enrollment candidates in one call, then dedup each in order."""
+        try:
+            embs = self._embed_aligned([aligned for _, _, aligned, _ in batch])
+        except Exception as e:
+            logging.error(f'Error in learn_new_face: {e}')
+            return
+        for (_, _, _, thumb), embedding in zip(batch, embs):
+            # Skip if this already matches an enrolled person
+            best = self.gallery.best(embedding)
+            if best is not None and best[1] > DEDUP_THRESHOLD:
+                logging.info(f'Matches existing {best[0]}, skipping frame.')
+                continue
+
+            # Skip near-duplicates within this session
+            unit = normalize(embedding)
+            if session_embeddings and float(np.max(np.stack(session_embeddings) @ unit)) > DEDUP_THRESHOLD:
+                continue
+            session_embeddings.append(unit)
+            logging.info(f'Embedding #{len(session_embeddings)} for {person_name}')
+
+            # Seed the gallery with a crop from each accepted (diverse) frame
+            if self.event_logger is not None and thumb is not None:
+                try:
+                    self.event_logger.add_face_image(thumb, person_name)
+                except Exception as e:
+                    logging.error(f'Error in learn_new_face: {e}')
+
     # ---------------------------------------------------------- dashboard API
 
     def get_faces_info(self):
-        with self._lock:
-            names = list(self.known_face_names)
-            encodings = list(self.known_face_encodings)
+        names, counts = self.gallery.names, self.gallery.counts()
         result = []
-        for n, e in zip(names, encodings):
+        for n, c in zip(names, counts):
             images = self.event_logger.face_images(n) if self.event_logger else []
             result.append({
                 'name': n,
-                'embedding_count': len(e),
+                'embedding_count': c,
                 'images': images,
                 'has_snapshot': len(images) > 0,
             })
         return result
 
+    def index_stats(self):
+        """Gallery index backend, size and (for IVF) recall vs. the exact scan."""
+        return self.gallery.index_report()
+
     def rename_face(self, old, new):
         new = (new or '').strip()
         if not new:
             return {'success': False, 'error': 'Name cannot be empty'}
         with self._lock:
-            if old not in self.known_face_names:
+            if old not in self.gallery:
                 return {'success': False, 'error': 'Person not found'}
-            if new != old and new in self.known_face_names:
+            if new != old and new in self.gallery:
                 return {'success': False, 'error': 'A person with that name already exists'}
-            idx = self.known_face_names.index(old)
-            self.known_face_names[idx] = new
+            self.gallery.rename(old, new)
         if self.event_logger is not None:
             try:
                 self.event_logger.rename_face_images(old, new)
@@ -539,11 +1186,8 @@ class FaceRecognizer:
 
     def delete_face(self, name):
         with self._lock:
-            if name not in self.known_face_names:
+            if not self.gallery.delete(name):
                 return False
-            idx = self.known_face_names.index(name)
-            self.known_face_names.pop(idx)
-            self.known_face_encodings.pop(idx)
         self.save_face_data()
         if self.event_logger is not None:
             self.event_logger.delete_face_images(name)
@@ -0,0 +1,73 @@
+FULL_EVERY = 5       # full-frame SCRFD at least every N frames, even while tracking
+MIN_SCORE = 0.6      # a tracked face scoring below this triggers a full detection
+ROI_SCALE = 2.0      # ROI side = ROI_SCALE x the larger side of the last bbox
+NEW_TRACK_IOU = 0.3  # a full detection overlapping the last bbox less than this is a new face
+
+
+def iou(a, b):
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class FaceTracker:
+    """Follows one face across frames so SCRFD rarely has to scan the whole frame.
+
+    The camera is fixed and a visitor barely moves between frames, so after a
+    full-frame detection the next frames are searched only in a square ROI
+    around the previous bbox, at a small detector input (see
+    FaceRecognizer._detect). A full detection runs again every `full_every`
+    frames, whenever the tracked score drops below `min_score`, and straight
+    away on the same frame if the ROI comes back empty — so tracking can never
+    turn a visible face into a 'no face' frame.
+
+    `detect(frame, roi=None)` returns (bbox, kps) in full-resolution
+    coordinates, or None. track_id changes whenever a full detection finds a
+    face that isn't the one being tracked.
+    """
+
+    def __init__(self, detect, full_every=FULL_EVERY, min_score=MIN_SCORE, roi_scale=ROI_SCALE):
+        self.detect = detect
+        self.full_every = full_every
+        self.min_score = min_score
+        self.roi_scale = roi_scale
+        self.last = None
+        self.since_full = 0
+        self.track_id = 0
+        self.full_runs = 0
+        self.roi_runs = 0
+        self.roi_misses = 0
+
+    def _roi(self, bbox):
+        cx, cy = (bbox[0] + bbox[2]) / 2, (bbox[1] + bbox[3]) / 2
+        half = max(bbox[2] - bbox[0], bbox[3] - bbox[1]) * self.roi_scale / 2
+        return cx - half, cy - half, cx + half, cy + half
+
+    def update(self, frame):
+        last = self.last
+        if last is not None and self.since_full < self.full_every and last[0][4] >= self.min_score:
+            self.roi_runs += 1
+            det = self.detect(frame, roi=self._roi(last[0]))
+            if det is not None and det[0][4] >= self.min_score:
+                self.since_full += 1
+                self.last = det
+                return det
+            self.roi_misses += 1
+
+        det = self.detect(frame)
+        self.full_runs += 1
+        self.since_full = 0
+        if det is not None and (last is None or iou(det[0], last[0]) < NEW_TRACK_IOU):
+            self.track_id += 1
+        self.last = det
+        return det
+
+    def reset(self):
+        self.last = None
+        self.since_full = 0
+
+    def stats(self):
+        return {'detect_full': self.full_runs, 'detect_roi': self.roi_runs,
+                'roi_misses': self.roi_misses, 'tracks': self.track_id}
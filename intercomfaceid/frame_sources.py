@@ -0,0 +1,198 @@
+import logging
+import os
+import time
+
+import cv2
+import requests
+
+from mjpeg_parser import SOI, MjpegParser
+
+JPEG_QUALITY = 90   # re-encode quality when a source only yields raw pixels
+
+
+class FrameSource:
+    """Where StreamManager's JPEGs come from.
+
+    open() connects (raising on failure), read() blocks until it has data and
+    returns the complete JPEGs (bytes) it produced — possibly none — and
+    raises when the source broke or ran out; close() releases it. A source
+    can be opened again after close(). StreamManager does the rest (rate
+    limiting, ring, timestamps, seq numbers, leases), identically for all.
+    """
+
+    name = 'source'
+
+    def open(self):
+        raise NotImplementedError
+
+    def read(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {'source': self.name}
+
+    def __str__(self):
+        return self.name
+
+
+class MjpegHttpSource(FrameSource):
+    """multipart/x-mixed-replace MJPEG over HTTP (motionEye, most IP cameras)."""
+
+    def __init__(self, url, timeout=10, chunk=16384):
+        self.url = url
+        self.name = url
+        self.timeout = timeout
+        self.chunk = chunk
+        self.response = None
+        self.parser = None
+
+    def open(self):
+        self.response = requests.get(self.url, stream=True, timeout=self.timeout)
+        if self.response.status_code != 200:
+            status = self.response.status_code
+            self.close()
+            raise Exception(f"Failed to connect to stream. Status code: {status}")
+        self.parser = MjpegParser.from_content_type(self.response.headers.get('Content-Type'))
+
+    def read(self):
+        chunk = self.response.raw.read(self.chunk)
+        if not chunk:
+            raise Exception("No data received from stream.")
+        return self.parser.feed(chunk)
+
+    def close(self):
+        if self.response is not None:
+            self.response.close()
+            self.response = None
+
+    def stats(self):
+        return {'source': self.name, 'parser': self.parser.stats() if self.parser is not None else None}
+
+
+class VideoCaptureSource(FrameSource):
+    """cv2.VideoCapture on a V4L2 device (/dev/video0, or its index) or a video
+    file. A device is asked for MJPEG with conversion off, so the capture
+    card's own JPEGs are passed through untouched; anything that arrives as
+    pixels is encoded once. Files are played back at their own frame rate."""
+
+    def __init__(self, target, width=None, height=None, jpeg_quality=JPEG_QUALITY):
+        self.target = target
+        self.name = str(target)
+        self.width = width
+        self.height = height
+        self.jpeg_quality = jpeg_quality
+        self.is_file = isinstance(target, str) and os.path.isfile(target)
+        self.cap = None
+        self.passthrough = 0    # frames delivered as the device's own JPEG
+        self.encoded = 0        # frames we had to encode
+        self._interval = 0.0
+        self._next = 0.0
+
+    def open(self):
+        target = self.target
+        if isinstance(target, str) and target.isdigit():
+            target = int(target)
+        self.cap = cv2.VideoCapture(target)
+        if not self.cap.isOpened():
+            self.close()
+            raise Exception(f"Could not open video source {self.name}")
+        if self.is_file:
+            fps = self.cap.get(cv2.CAP_PROP_FPS) or 0
+            self._interval = 1.0 / fps if fps > 0 else 0.0
+            self._next = time.monotonic()
+        else:
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*'MJPG'))
+            if self.width and self.height:
+                self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+                self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0)
+
+    def read(self):
+        if self._interval:
+            wait = self._next - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._next = max(self._next + self._interval, time.monotonic() - self._interval)
+        ok, img = self.cap.read()
+        if not ok or img is None:
+            raise Exception(f"No frame from {self.name}" + (" (end of file)" if self.is_file else ""))
+        if img.ndim < 3 or img.shape[0] == 1:
+            raw = img.tobytes()
+            if raw[:2] == SOI:
+                self.passthrough += 1
+                return [raw]
+        if img.ndim == 2:
+            img = cv2.cvtColor(img, cv2.COLOR_GRAY2BGR)
+        ok, buf = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            return []
+        self.encoded += 1
+        return [buf.tobytes()]
+
+    def close(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def stats(self):
+        return {'source': self.name, 'passthrough': self.passthrough, 'encoded': self.encoded}
+
+
+class ImageDirectorySource(FrameSource):
+    """The .jpg files of a directory, in name order, replayed at `fps` —
+    for offline benchmarks and tests. Loops forever unless loop=False, in
+    which case read() raises after the last file."""
+
+    def __init__(self, path, fps=7, loop=True):
+        self.path = path
+        self.name = path
+        self.fps = fps
+        self.loop = loop
+        self.files = []
+        self._i = 0
+        self._next = 0.0
+        self.served = 0
+
+    def open(self):
+        self.files = sorted(os.path.join(self.path, f) for f in os.listdir(self.path)
+                            if f.lower().endswith(('.jpg', '.jpeg')))
+        if not self.files:
+            raise Exception(f"No JPEG files in {self.path}")
+        self._i = 0
+        self._next = time.monotonic()
+
+    def read(self):
+        if self._i >= len(self.files):
+            if not self.loop:
+                raise Exception(f"End of {self.path}")
+            self._i = 0
+        wait = self._next - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self._next = max(self._next + 1.0 / self.fps, time.monotonic())
+        with open(self.files[self._i], 'rb') as f:
+            jpeg = f.read()
+        self._i += 1
+        self.served += 1
+        return [jpeg]
+
+    def stats(self):
+        return {'source': self.name, 'files': len(self.files), 'served': self.served}
+
+
+def make_source(spec, fps=7):
+    """A FrameSource from a config string: an http(s) URL (MJPEG), a directory
+    (JPEG replay at `fps`), or a V4L2 device / its index / a video file."""
+    if isinstance(spec, FrameSource):
+        return spec
+    spec = str(spec).strip()
+    if spec.startswith(('http://', 'https://')):
+        return MjpegHttpSource(spec)
+    if os.path.isdir(spec):
+        return ImageDirectorySource(spec, fps=fps)
+    if not (spec.isdigit() or spec.startswith('/dev/') or os.path.isfile(spec)):
+        logging.warning(f"Frame source {spec} does not exist (yet); trying cv2.VideoCapture anyway.")
+    return VideoCaptureSource(spec)
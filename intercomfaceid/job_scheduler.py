@@ -0,0 +1,217 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+# Lower runs first among queued jobs. A running job is never preempted — it
+# finishes (or is cancelled) before the next one starts.
+PRIORITY_BELL = 0        # someone rang THIS door
+PRIORITY_USER = 1        # MQTT buttons, web requests
+PRIORITY_BACKGROUND = 2  # work nobody is waiting on
+HISTORY = 20             # finished jobs kept for stats()
+
+
+class Job:
+    """One unit of camera work. state: queued -> running -> done / failed /
+    cancelled (a queued job can go straight to cancelled). wait() blocks
+    until it finished either way; result / error hold the outcome."""
+
+    def __init__(self, job_id, kind, fn, priority, key, on_cancel):
+        self.id = job_id
+        self.kind = kind
+        self.fn = fn
+        self.priority = priority
+        self.key = key
+        self.on_cancel = on_cancel
+        self.state = 'queued'
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.coalesced = 0            # later submits folded into this job
+        self.cancel_requested = False
+        self._done = threading.Event()
+
+    def wait(self, timeout=None):
+        return self._done.wait(timeout)
+
+    def info(self):
+        info = {'id': self.id, 'kind': self.kind, 'state': self.state, 'priority': self.priority}
+        if self.coalesced:
+            info['coalesced'] = self.coalesced
+        if self.started is not None:
+            info['wait_ms'] = round((self.started - self.submitted) * 1000)
+        if self.finished is not None and self.started is not None:
+            info['run_ms'] = round((self.finished - self.started) * 1000)
+        if self.error is not None:
+            info['error'] = self.error
+        return info
+
+
+class JobScheduler:
+    """Single worker thread that runs every recognition / enrollment /
+    benchmark job, so whoever triggers one (serial loop, paho's network
+    thread, a web request) returns immediately instead of owning the camera
+    for up to 30 s.
+
+    Jobs submitted with a `key` coalesce: while a job with that key is queued
+    or running, submitting another returns the existing job (repeated bells
+    during a session start no second session). A coalesced submit with a
+    higher priority promotes the queued job. cancel() drops a queued job, or
+    flags a running one and calls its on_cancel hook so it can stop early.
+    Every state change is written to the event log as a 'job' event.
+    """
+
+    def __init__(self, event_logger=None, history=HISTORY):
+        self.event_logger = event_logger
+        self._cv = threading.Condition()
+        self._heap = []                  # (priority, id, job); stale entries skipped
+        self._ids = itertools.count(1)
+        self.current = None
+        self.recent = deque(maxlen=history)
+        self._thread = None
+        self._stop = False
+        self.submitted = 0
+        self.coalesced = 0
+
+    def start(self):
+        with self._cv:
+            if self._thread is not None:
+                return self
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name='jobs', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, cancel_running=True):
+        with self._cv:
+            self._stop = True
+            running = self.current
+            self._cv.notify_all()
+        if cancel_running and running is not None:
+            self.cancel(running)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def submit(self, kind, fn, priority=PRIORITY_USER, key=None, on_cancel=None):
+        """Queue fn() to run on the worker; returns its Job (or, when `key`
+        matches a queued/running job, that job)."""
+        with self._cv:
+            job = self._find(key) if key is not None else None
+            if job is not None:
+                job.coalesced += 1
+                self.coalesced += 1
+                if job.state == 'queued' and priority < job.priority:
+                    job.priority = priority
+                    heapq.heappush(self._heap, (priority, job.id, job))
+                state = 'coalesced'
+            else:
+                job = Job(next(self._ids), kind, fn, priority, key, on_cancel)
+                heapq.heappush(self._heap, (priority, job.id, job))
+                self.submitted += 1
+                self._cv.notify()
+                state = None
+        self._log(job, state)
+        return job
+
+    def cancel(self, job):
+        """True if the job was queued (now dropped) or running (now asked to stop)."""
+        with self._cv:
+            if job.state == 'queued':
+                job.state = 'cancelled'
+                job.finished = time.time()
+                self.recent.append(job)
+                job._done.set()
+                hook = None
+            elif job.state == 'running' and not job.cancel_requested:
+                job.cancel_requested = True
+                hook = job.on_cancel
+            else:
+                return False
+        self._log(job, job.state if job.state == 'cancelled' else 'cancelling')
+        if hook is not None:
+            try:
+                hook()
+            except Exception as e:
+                logging.error(f"Error cancelling job {job.kind}#{job.id}: {e}")
+        return True
+
+    def cancel_kind(self, kind):
+        """Cancel every queued or running job of a kind; returns how many."""
+        with self._cv:
+            jobs = [j for _, _, j in self._heap if j.kind == kind and j.state == 'queued']
+            if self.current is not None and self.current.kind == kind:
+                jobs.append(self.current)
+        return sum(1 for job in set(jobs) if self.cancel(job))
+
+    def get(self, job_id):
+        with self._cv:
+            for job in (self.current, *(j for _, _, j in self._heap), *self.recent):
+                if job is not None and job.id == job_id:
+                    return job
+        return None
+
+    def _find(self, key):
+        if self.current is not None and self.current.key == key and not self.current.cancel_requested:
+            return self.current
+        for _, _, job in self._heap:
+            if job.key == key and job.state == 'queued':
+                return job
+        return None
+
+    def _run(self):
+        while True:
+            with self._cv:
+                while not self._stop and not self._heap:
+                    self._cv.wait()
+                if self._stop:
+                    return
+                priority, _, job = heapq.heappop(self._heap)
+                if job.state != 'queued' or priority != job.priority:
+                    continue   # cancelled, or a stale entry left by a promotion
+                job.state = 'running'
+                job.started = time.time()
+                self.current = job
+            self._log(job)
+            try:
+                job.result = job.fn()
+                state = 'cancelled' if job.cancel_requested else 'done'
+            except Exception as e:
+                logging.error(f"Job {job.kind}#{job.id} failed: {e}")
+                job.error = str(e)
+                state = 'failed'
+            with self._cv:
+                job.state = state
+                job.finished = time.time()
+                self.current = None
+                self.recent.append(job)
+            job._done.set()
+            self._log(job)
+
+    def _log(self, job, state=None):
+        if self.event_logger is None:
+            return
+        try:
+            info = job.info()
+            if state is not None:
+                info['state'] = state
+            info['job_id'] = info.pop('id')
+            self.event_logger.log('job', **info)
+        except Exception as e:
+            logging.debug(f"job event not logged: {e}")
+
+    def stats(self):
+        with self._cv:
+            queued = sorted((j for _, _, j in self._heap if j.state == 'queued'),
+                            key=lambda j: (j.priority, j.id))
+            return {
+                'running': self.current.info() if self.current is not None else None,
+                'queued': [j.info() for j in dict.fromkeys(queued)],
+                'recent': [j.info() for j in reversed(self.recent)],
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+            }
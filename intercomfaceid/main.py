@@ -2,11 +2,16 @@ from stream_manager import StreamManager
 from face_recognizer import FaceRecognizer
 from event_logger import EventLogger
 from blur_calibration import BlurCalibration
+from job_scheduler import JobScheduler
+from readiness import Readiness
 import web_server
 import mqtt_handler
 import arduino_handler
+import threading
 import time
+import json
 import logging
+import os
 import sys
 
 # The TCS bus carries a lot of traffic. 4-digit (or shorter) codes are heartbeat
@@ -26,14 +31,38 @@ DOORBELL_CODES = {"0C594F80"}
 # the intercom emits when the door opens — it's not a ring, so no point capturing.
 UNLOCK_ECHO_CODES = {"1C594F80"}
 
-
-def _signal_code(command):
-    """Extract the code portion of a 'call:XXXX' / 'Received HEX: XXXX' line."""
-    if command.startswith("call:"):
-        return command[len("call:"):].strip()
-    if command.startswith("Received HEX:"):
-        return command[len("Received HEX:"):].strip()
-    return None
+# Pre-bell buffer: keep the stream connected and remember the last N seconds of
+# (undecoded) JPEGs, so recognition starts from frames taken BEFORE the bell was
+# read. Costs a permanent connection plus parsing, never decoding. 0 = off:
+# the stream is only connected on demand. PREBUFFER_MB caps the memory it may
+# take (the add-on has 512 MB; the models and gallery need well over 200).
+PREBUFFER_S = 0
+PREBUFFER_MB = 32
+
+# Standby watch: keep the stream connected and recognise whoever stands at the
+# door at a low frame rate (face_recognizer.STANDBY_FPS), so a bell from an
+# enrolled person unlocks instantly from the cached identity. Off = on demand.
+STANDBY_WATCH = False
+
+# Where frames come from unless the add-on option `stream_source` says otherwise:
+# motionEye's MJPEG stream of the USB capturer. Use the host IP, NOT
+# homeassistant.local — resolving the .local name inside the add-on container
+# hits a ~10s unicast-DNS timeout before falling back to mDNS, which dominated
+# the bell→recognition latency. The option also takes a V4L2 device
+# (/dev/video0) to read the capturer directly, a video file, or a directory of
+# JPEGs to replay (see frame_sources.make_source).
+STREAM_SOURCE = "http://192.168.2.45:9081"
+
+
+def load_options(path='/data/options.json'):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f) or {}
+    except (OSError, json.JSONDecodeError) as e:
+        logging.error(f"Error reading add-on options {path}: {e}")
+        return {}
 
 
 def main():
@@ -43,78 +72,136 @@ def main():
     enable_mqtt = True
     enable_arduino = True
 
+    # Subsystems start side by side (model load, serial port, MQTT broker)
+    # and report here when they're up; see /api/status.
+    readiness = Readiness()
     event_logger = EventLogger(data_dir='/data')
     blur_calibration = BlurCalibration(path='/data/blur_calibration.json')
 
     face_recognizer = None
     arduino = None
     mqtt_client = None
+    # Every camera session (bell, MQTT buttons, web benchmark) runs on this
+    # one worker, so neither this loop nor paho's network thread
+    # is ever blocked by a 30 s recognition session.
+    scheduler = JobScheduler(event_logger=event_logger).start()
 
     if enable_face_recognition:
-        # Read frames on demand from motionEye's MJPEG stream (the USB capturer).
-        # Use the host IP, NOT homeassistant.local — resolving the .local name
-        # inside the add-on container hits a ~10s unicast-DNS timeout before
-        # falling back to mDNS, which dominated the bell→recognition latency.
-        stream_manager = StreamManager("http://192.168.2.45:9081", autostart=False)
+        options = load_options()
+        # Read frames on demand from the configured source.
+        source = options.get('stream_source') or STREAM_SOURCE
+        stream_manager = StreamManager(source, autostart=False,
+                                       prebuffer_s=PREBUFFER_S, prebuffer_mb=PREBUFFER_MB)
+        # The gallery loads here; buffalo_sc loads on a start-up thread below.
         face_recognizer = FaceRecognizer(stream_manager, event_logger=event_logger,
-                                         blur_calibration=blur_calibration)
+                                         blur_calibration=blur_calibration, load_model=False,
+                                         model_variant=options.get('model_variant') or 'fp32')
+
+    # Dashboard first: it's served while everything else is still coming up.
+    web_server.start_in_thread(event_logger, face_recognizer, port=8099,
+                               blur_calibration=blur_calibration, scheduler=scheduler,
+                               readiness=readiness)
+
+    if enable_face_recognition:
+        readiness.run('model', face_recognizer.load_model)
     if enable_arduino:
-        arduino = arduino_handler.ArduinoHandler(event_logger=event_logger)
+        # Lines are classified on the handler's reader thread (doorbell / echo /
+        # signal / unlock) so the loop below can act on them without re-parsing.
+        arduino = arduino_handler.ArduinoHandler(event_logger=event_logger,
+                                                 doorbell_codes=DOORBELL_CODES,
+                                                 unlock_echo_codes=UNLOCK_ECHO_CODES,
+                                                 connect_async=True)
+        readiness.run('arduino', arduino.wait_connected)
     if enable_mqtt:
         mqtt_client = mqtt_handler.MQTTHandler()
+        readiness.run('mqtt', mqtt_client.wait_connected)
 
     if enable_face_recognition:
         face_recognizer.set_arduino(arduino)
         face_recognizer.set_mqtt_client(mqtt_client)
+        face_recognizer.set_scheduler(scheduler)
     if enable_arduino:
         arduino.set_mqtt_client(mqtt_client)
     if enable_mqtt:
         mqtt_client.set_face_recognizer(face_recognizer)
         mqtt_client.set_arduino(arduino)
 
-    web_server.start_in_thread(event_logger, face_recognizer, port=8099,
-                               blur_calibration=blur_calibration)
+    if enable_face_recognition and STANDBY_WATCH:
+        face_recognizer.start_standby()
+
+    # Signal snapshots only peek at the stream, so they don't queue behind a
+    # recognition session on the job worker: one short-lived thread takes the
+    # snapshot, and every signal that arrives meanwhile shares it. The events
+    # are stamped with when the line arrived, not when the snapshot was saved.
+    signal_lock = threading.Lock()
+    pending_signals = []
+
+    def snapshot_signals():
+        snap = None
+        try:
+            snap = face_recognizer.capture_snapshot()
+        except Exception as e:
+            logging.error(f"Error capturing signal snapshot: {e}")
+        with signal_lock:
+            signals = pending_signals[:]
+            pending_signals.clear()
+        for cmd in signals:
+            event_logger.log('hex_received', at=cmd.received, command=cmd.line, snapshot=snap)
+
+    def log_signal(cmd):
+        with signal_lock:
+            pending_signals.append(cmd)
+            if len(pending_signals) > 1:
+                return      # a snapshot is already being taken
+        threading.Thread(target=snapshot_signals, name='signal-snapshot', daemon=True).start()
 
     while True:
         if enable_mqtt:
             mqtt_client.process_messages()
 
-        if enable_arduino:
-            command = arduino.read_command()  # 4-digit noise already dropped upstream
-            if command:
-                code = _signal_code(command)
-                if code is not None and code in DOORBELL_CODES:
-                    # Our doorbell: snapshot + recognition (+ unlock if recognised).
-                    logging.info(f"Doorbell: {command}")
-                    if enable_mqtt:
-                        try:
-                            mqtt_client.publish_bell_state()
-                        except Exception as e:
-                            logging.error(f"Error publishing bell state: {e}")
-                    if enable_face_recognition:
-                        try:
-                            face_recognizer.captureFace(run_recognition=True)
-                        except Exception as e:
-                            logging.error(f"Error during face capture: {e}")
-                elif code is not None:
-                    # Another unit's call / bus signal: capture a live snapshot for
-                    # the activity log so we can see who's there — but NO recognition
-                    # and NO unlock. The unlock echo gets logged without a snapshot.
-                    snap = None
-                    if enable_face_recognition and code not in UNLOCK_ECHO_CODES:
-                        try:
-                            snap = face_recognizer.capture_snapshot()
-                        except Exception as e:
-                            logging.error(f"Error capturing signal snapshot: {e}")
-                    logging.info(f"Signal: {command}")
-                    event_logger.log('hex_received', command=command, snapshot=snap)
-                elif command.lower() == "unlock":
-                    event_logger.log('door_unlocked')
-                    logging.info("Received unlock command")
-                else:
-                    event_logger.log('serial_command', command=command)
-
-        time.sleep(1)
+        if not enable_arduino:
+            time.sleep(1)
+            continue
+
+        # Blocks until the reader thread pushes a line — a doorbell is handled the
+        # moment it arrives. 4-digit noise is already dropped upstream.
+        cmd = arduino.get_command(timeout=1)
+        if cmd is None:
+            continue
+        if cmd.kind == 'give_up':
+            # The serial port is gone for good: exit so the supervisor
+            # restarts the add-on (see ArduinoHandler.connect).
+            sys.exit(1)
+        command = cmd.line
+        if cmd.kind == 'doorbell':
+            # Our doorbell: snapshot + recognition (+ unlock if recognised).
+            logging.info(f"Doorbell: {command}")
+            if enable_mqtt:
+                try:
+                    mqtt_client.publish_bell_state()
+                except Exception as e:
+                    logging.error(f"Error publishing bell state: {e}")
+            if enable_face_recognition:
+                # Queued, not run here: repeated bells while a session is
+                # queued or running fold into it, and a bell during start-up
+                # waits in the queue for the model instead of being lost.
+                if not readiness.is_ready('model'):
+                    logging.info("Doorbell queued until the face model is loaded")
+                face_recognizer.request_capture(rang_at=cmd.received)
+        elif cmd.kind in ('signal', 'unlock_echo'):
+            # Another unit's call / bus signal: capture a live snapshot for
+            # the activity log so we can see who's there — but NO recognition
+            # and NO unlock. The unlock echo gets logged without a snapshot.
+            logging.info(f"Signal: {command}")
+            if enable_face_recognition and cmd.kind != 'unlock_echo':
+                log_signal(cmd)
+            else:
+                event_logger.log('hex_received', at=cmd.received, command=command, snapshot=None)
+        elif cmd.kind == 'unlock':
+            event_logger.log('door_unlocked')
+            logging.info("Received unlock command")
+        else:
+            event_logger.log('serial_command', command=command)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,222 @@
+import re
+
+SOI = b'\xff\xd8'
+EOI = b'\xff\xd9'
+
+HEADER_END = b'\r\n\r\n'
+MAX_HEADER = 2048        # a part header block longer than this isn't a header block
+COMPACT_AT = 256 * 1024  # drop consumed bytes once at least this many have piled up
+
+# SOFn markers carry the frame size; C4 (DHT), C8 (JPG) and CC (DAC) don't.
+_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+_CONTENT_LENGTH = re.compile(rb'content-length\s*:\s*(\d+)', re.IGNORECASE)
+_BOUNDARY = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+
+
+def jpeg_size(jpeg):
+    """(width, height) from the JPEG's SOF header, without decoding. Walks the
+    marker segments only, so it touches a few hundred bytes at most. Returns
+    None if no SOF segment is found."""
+    i, n = 2, len(jpeg)
+    while i + 9 < n:
+        if jpeg[i] != 0xFF:
+            return None
+        marker = jpeg[i + 1]
+        if marker == 0xFF:      # fill byte
+            i += 1
+            continue
+        if marker in _SOF_MARKERS:
+            h = (jpeg[i + 5] << 8) | jpeg[i + 6]
+            w = (jpeg[i + 7] << 8) | jpeg[i + 8]
+            return w, h
+        if marker == 0xDA:      # start of scan — past all the headers
+            return None
+        i += 2 + ((jpeg[i + 2] << 8) | jpeg[i + 3])
+    return None
+
+
+class MjpegParser:
+    """Incremental multipart MJPEG parser over one reusable bytearray.
+
+    feed() appends a chunk and returns EVERY complete JPEG it now holds. The
+    buffer is never rebuilt: consumed bytes are only dropped in bulk once they
+    pile up, and a search that runs off the end of the data remembers where it
+    stopped, so each byte is scanned once rather than once per chunk.
+
+    When the server sends per-part Content-Length headers (motionEye does) the
+    frame is sliced out by length with no byte scanning at all; otherwise it
+    falls back to an SOI/EOI marker scan. Each frame is copied exactly once,
+    out of the buffer into its own bytes object.
+
+    With the multipart boundary (from_content_type), every part's headers are
+    looked for right after its boundary delimiter, so a Content-Length that
+    lies — too short, too long, or pointing at something that isn't a JPEG —
+    costs at most that part: parsing resyncs at the next delimiter instead of
+    reading headers out of the middle of a JPEG. A boundary the stream never
+    actually uses is dropped and the parts are framed without it.
+    """
+
+    # parser states
+    _HEADERS, _BODY, _SCAN = range(3)
+
+    def __init__(self, boundary=None):
+        self.boundary = boundary.encode() if isinstance(boundary, str) else boundary
+        # The delimiter token without its leading dashes: servers disagree on
+        # whether the declared boundary includes them.
+        self._delim = self.boundary.lstrip(b'-') if self.boundary else None
+        self._delim_seen = False
+        self._in_part = False  # _HEADERS: past this part's delimiter already
+        self._buf = bytearray()
+        self._pos = 0          # start of unconsumed data
+        self._scan = 0         # resume offset for the current search
+        self._state = self._HEADERS
+        self._body_start = 0   # _BODY: first byte of the JPEG
+        self._body_len = 0     # _BODY: Content-Length of the part
+        self._soi = -1         # _SCAN: offset of the SOI marker, once found
+        self.frames = 0
+        self.bytes_in = 0
+        self.bytes_copied = 0  # chunk appends + frame copies + compaction moves
+        self.length_framed = 0  # frames delimited by Content-Length (no scan)
+        self.resyncs = 0       # times junk had to be skipped to reach a boundary
+
+    @classmethod
+    def from_content_type(cls, content_type):
+        """Build a parser from the response's multipart Content-Type header."""
+        m = _BOUNDARY.search(content_type or '')
+        return cls(boundary=m.group(1).strip() if m else None)
+
+    def reset(self):
+        self.__init__(boundary=self.boundary)
+
+    def feed(self, chunk):
+        buf = self._buf
+        buf += chunk
+        self.bytes_in += len(chunk)
+        self.bytes_copied += len(chunk)
+
+        frames = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                break
+            frames.append(frame)
+        self._compact()
+        return frames
+
+    def _next_frame(self):
+        buf = self._buf
+        if self._state == self._HEADERS:
+            if not self._parse_headers():
+                return None
+
+        if self._state == self._BODY:
+            end = self._body_start + self._body_len
+            if len(buf) < end:
+                return None
+            if buf[self._body_start:self._body_start + 2] != SOI:
+                # Length header lied (or we lost sync): resync at the next
+                # boundary if there is one, else rescan for markers from here.
+                if self._delim is not None:
+                    self._state, self._pos, self._scan = self._HEADERS, self._body_start, self._body_start
+                    self._in_part = False
+                else:
+                    self._state, self._scan, self._soi = self._SCAN, self._body_start, -1
+                return self._next_frame()
+            self.length_framed += 1
+            return self._take(self._body_start, end)
+
+        # _SCAN: SOI ... EOI, resuming where the last pass left off.
+        if self._soi < 0:
+            a = buf.find(SOI, self._scan)
+            if a == -1:
+                # Keep the last byte: it may be the first half of a split marker.
+                self._scan = max(self._pos, len(buf) - 1)
+                return None
+            self._soi, self._scan = a, a + 2
+        b = buf.find(EOI, self._scan)
+        if b == -1:
+            self._scan = max(self._soi + 2, len(buf) - 1)
+            return None
+        return self._take(self._soi, b + 2)
+
+    def _find_delimiter(self):
+        """Move _pos past the next boundary delimiter. Returns False if more data
+        is needed."""
+        buf, delim = self._buf, self._delim
+        d = buf.find(delim, self._scan)
+        if d == -1:
+            if not self._delim_seen and len(buf) - self._pos >= MAX_HEADER:
+                # Declared, but the parts aren't delimited by it.
+                self._delim = None
+                return True
+            self._scan = max(self._pos, len(buf) - len(delim) + 1)
+            return False
+        if buf[self._pos:d].strip(b'\r\n-'):
+            self.resyncs += 1   # bytes between the last frame and this part
+        self._delim_seen = self._in_part = True
+        self._pos = self._scan = d + len(delim)
+        return True
+
+    def _parse_headers(self):
+        """Locate the next part's header block. Returns False if more data is needed."""
+        if self._delim is not None and not self._in_part and not self._find_delimiter():
+            return False
+        buf = self._buf
+        limit = min(len(buf), self._pos + MAX_HEADER)
+        end = buf.find(HEADER_END, self._scan, limit)
+        soi = buf.find(SOI, self._pos, limit)
+        if end == -1 or (soi != -1 and soi < end):
+            if soi != -1 or limit - self._pos >= MAX_HEADER:
+                # Headerless stream (bare concatenated JPEGs): marker scan.
+                self._state, self._scan, self._soi = self._SCAN, self._pos, -1
+                return True
+            self._scan = max(self._pos, limit - len(HEADER_END) + 1)
+            return False
+
+        m = _CONTENT_LENGTH.search(buf, self._pos, end)
+        body = end + len(HEADER_END)
+        if m:
+            self._state = self._BODY
+            self._body_start = body
+            self._body_len = int(m.group(1))
+        else:
+            self._state, self._scan, self._soi = self._SCAN, body, -1
+        return True
+
+    def _take(self, start, end):
+        with memoryview(self._buf) as mv:
+            frame = bytes(mv[start:end])
+        self.bytes_copied += end - start
+        self.frames += 1
+        self._pos = self._scan = end
+        self._soi = -1
+        self._state = self._HEADERS
+        self._in_part = False
+        return frame
+
+    def _compact(self):
+        pos = self._pos
+        if pos == 0:
+            return
+        if pos < COMPACT_AT and pos < len(self._buf):
+            return
+        remaining = len(self._buf) - pos
+        del self._buf[:pos]
+        self.bytes_copied += remaining
+        self._pos = 0
+        self._scan -= pos
+        if self._soi >= 0:
+            self._soi -= pos
+        if self._state == self._BODY:
+            self._body_start -= pos
+
+    def stats(self):
+        return {
+            'frames': self.frames,
+            'bytes_in': self.bytes_in,
+            'bytes_copied': self.bytes_copied,
+            'copied_per_frame': round(self.bytes_copied / self.frames) if self.frames else None,
+            'length_framed': self.length_framed,
+            'resyncs': self.resyncs,
+        }
@@ -0,0 +1,190 @@
+import glob
+import hashlib
+import logging
+import os
+import platform
+import time
+
+import numpy as np
+import onnxruntime as ort
+from insightface.model_zoo.arcface_onnx import ArcFaceONNX
+from insightface.model_zoo.scrfd import SCRFD
+from insightface.utils import ensure_available
+
+MODEL_PACK = 'buffalo_sc'
+# 'fp32' = the pack as shipped; 'int8_dynamic' / 'int8_static' = the files
+# quantize_models.py wrote to QUANT_DIR (missing ones fall back to fp32).
+VARIANTS = ('fp32', 'int8_dynamic', 'int8_static')
+QUANT_DIR = '/data/models'
+CACHE_DIR = '/data/ort_cache'  # optimized graphs, reused by later starts ('' = no cache)
+OPT_LEVEL = 'all'              # ORT graph optimization: 'basic', 'extended' or 'all'
+EXECUTION_MODE = 'sequential'  # 'parallel' only pays off for graphs with independent branches
+# Intra-op threads per model. 0 = half the cores each: detection and embedding
+# run at the same time on separate Pipeline stages, so two full-size pools
+# would just fight over the same cores.
+INTRA_THREADS = {'detection': 0, 'recognition': 0}
+INTER_THREADS = 1
+# Busy-waiting ORT workers burn a core between frames, which the other
+# stage (and frame decoding) could have used.
+ALLOW_SPINNING = False
+CV_THREADS = 1                 # OpenCV's pool (decode / resize / Laplacian) — kept out of ORT's way
+
+_LEVELS = {
+    'basic': ort.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    'extended': ort.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    'all': ort.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+_MODES = {
+    'sequential': ort.ExecutionMode.ORT_SEQUENTIAL,
+    'parallel': ort.ExecutionMode.ORT_PARALLEL,
+}
+
+
+def model_files(pack=MODEL_PACK):
+    """{'detection': path, 'recognition': path} of a model pack, downloading
+    it on first use exactly like insightface.app.FaceAnalysis does."""
+    model_dir = ensure_available('models', pack, root='~/.insightface')
+    files = {}
+    for path in sorted(glob.glob(os.path.join(model_dir, '*.onnx'))):
+        role = 'detection' if os.path.basename(path).startswith('det') else 'recognition'
+        files.setdefault(role, path)
+    missing = {'detection', 'recognition'} - set(files)
+    if missing:
+        raise FileNotFoundError(f"{pack} in {model_dir} has no {', '.join(sorted(missing))} model")
+    return files
+
+
+def variant_path(src, variant, pack=MODEL_PACK):
+    """Where quantize_models.py puts `variant` of the fp32 model `src`."""
+    stem = os.path.splitext(os.path.basename(src))[0]
+    return os.path.join(QUANT_DIR, pack, f'{stem}.{variant}.onnx')
+
+
+def variant_files(files, variant, pack=MODEL_PACK):
+    """{role: (path to run, variant it is)} for model_files() output. A
+    quantized file that hasn't been produced yet falls back to fp32."""
+    if variant not in VARIANTS:
+        raise ValueError(f'Unknown model variant {variant!r}, expected one of {VARIANTS}')
+    out = {}
+    for role, src in files.items():
+        path = src if variant == 'fp32' else variant_path(src, variant, pack)
+        if not os.path.exists(path):
+            logging.warning(f'{variant} {role} model {path} not found (run quantize_models.py), using fp32')
+            path, used = src, 'fp32'
+        else:
+            used = variant
+        out[role] = (path, used)
+    return out
+
+
+def _threads(role):
+    n = INTRA_THREADS.get(role, 0)
+    return n if n > 0 else max(1, (os.cpu_count() or 2) // 2)
+
+
+def _cache_path(src, level):
+    """Cache file for src optimized at `level` by this ORT build on this CPU
+    architecture. Any change to those (or to the source file) is a new key."""
+    st = os.stat(src)
+    key = f'{os.path.abspath(src)}|{st.st_size}|{st.st_mtime_ns}|{ort.__version__}|{platform.machine()}|{level}'
+    stem = os.path.splitext(os.path.basename(src))[0]
+    return os.path.join(CACHE_DIR, f'{stem}.{hashlib.sha1(key.encode()).hexdigest()[:12]}.onnx')
+
+
+def _drop_stale(path):
+    """Remove older cache entries of the same model (stem.<key>.onnx)."""
+    stem = os.path.basename(path).rsplit('.', 2)[0]
+    for old in glob.glob(os.path.join(CACHE_DIR, f'{stem}.*.onnx')):
+        if old != path and os.path.basename(old).rsplit('.', 2)[0] == stem:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def session_options(role, level=OPT_LEVEL):
+    so = ort.SessionOptions()
+    so.intra_op_num_threads = _threads(role)
+    so.inter_op_num_threads = INTER_THREADS
+    so.execution_mode = _MODES[EXECUTION_MODE]
+    so.graph_optimization_level = _LEVELS[level]
+    if not ALLOW_SPINNING:
+        so.add_session_config_entry('session.intra_op.allow_spinning', '0')
+        so.add_session_config_entry('session.inter_op.allow_spinning', '0')
+    return so
+
+
+def create_session(src, role):
+    """InferenceSession for one model. The graph ORT optimizes on the first
+    start is written to CACHE_DIR; later starts load that file with
+    optimization switched off, skipping the work. Returns (session, info)."""
+    t0 = time.perf_counter()
+    so = session_options(role)
+    cached = False
+    path = src
+    if CACHE_DIR:
+        cache = _cache_path(src, OPT_LEVEL)
+        if os.path.exists(cache):
+            path, cached = cache, True
+            so.graph_optimization_level = ort.GraphOptimizationLevel.ORT_DISABLE_ALL
+        else:
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                so.optimized_model_filepath = cache
+                _drop_stale(cache)
+            except OSError as e:
+                logging.warning(f'ORT cache disabled ({e})')
+    try:
+        sess = ort.InferenceSession(path, sess_options=so, providers=['CPUExecutionProvider'])
+    except Exception as e:
+        if not cached:
+            raise
+        # A corrupt / incompatible cache entry: rebuild from the original.
+        logging.warning(f'Cached graph {path} unusable ({e}), re-optimizing')
+        os.remove(path)
+        return create_session(src, role)
+    info = {'file': os.path.basename(src), 'cached': cached, 'threads': so.intra_op_num_threads,
+            'load_ms': round((time.perf_counter() - t0) * 1000, 1)}
+    return sess, info
+
+
+def load_models(det_size=(320, 320), det_thresh=0.5, pack=MODEL_PACK, variant='fp32'):
+    """SCRFD detector and ArcFace recognizer of `pack` on tuned sessions — what
+    FaceAnalysis(name=pack).prepare(ctx_id=0, det_size=...) gives, minus the
+    default ORT options. Returns (det, rec, report); the report has each
+    model's variant, load time, whether the optimized graph came from the
+    cache, and its first-inference time on a blank input."""
+    files = model_files(pack)
+    run = variant_files(files, variant, pack)
+    report = {'ort': ort.__version__, 'opt_level': OPT_LEVEL, 'cache_dir': CACHE_DIR or None,
+              'variant': variant}
+
+    sess, info = create_session(run['detection'][0], 'detection')
+    info['variant'] = run['detection'][1]
+    det = SCRFD(model_file=files['detection'], session=sess)
+    det.prepare(0, input_size=det_size, det_thresh=det_thresh)
+    t0 = time.perf_counter()
+    det.detect(np.zeros((det_size[1], det_size[0], 3), dtype=np.uint8), input_size=det_size)
+    info['first_inference_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+    report['detection'] = info
+
+    # ArcFaceONNX reads its input normalisation from the original graph, so
+    # it gets the source file even when the session runs the cached one.
+    sess, info = create_session(run['recognition'][0], 'recognition')
+    info['variant'] = run['recognition'][1]
+    rec = ArcFaceONNX(model_file=files['recognition'], session=sess)
+    rec.prepare(0)
+    t0 = time.perf_counter()
+    rec.get_feat([np.zeros((112, 112, 3), dtype=np.uint8)])
+    info['first_inference_ms'] = round((time.perf_counter() - t0) * 1000, 1)
+    report['recognition'] = info
+    return det, rec, report
+
+
+def format_report(report):
+    parts = []
+    for role in ('detection', 'recognition'):
+        r = report[role]
+        parts.append(f"{role} {r['file']} [{r.get('variant', 'fp32')}]: load {r['load_ms']}ms ({'cached graph' if r['cached'] else 'optimized now'}), "
+                     f"first inference {r['first_inference_ms']}ms, {r['threads']} threads")
+    return '; '.join(parts)
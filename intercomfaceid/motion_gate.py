@@ -0,0 +1,73 @@
+import cv2
+import numpy as np
+
+THUMB_SIZE = (32, 24)  # (w, h) greyscale thumbnail compared between frames
+STILL_DIFF = 2.0       # mean abs difference (0-255) below which the scene is unchanged
+SCENE_DIFF = 25.0      # ... above which it changed wholesale (tracking is pointless)
+MAX_REUSE = 10         # re-detect after this many reused results even if nothing moved
+
+
+def thumbnail(frame):
+    """Tiny greyscale thumbnail of a stream Frame (from its 1/8 DCT decode,
+    ~1% of a full decode) or of a BGR image."""
+    img = frame.reduced(8) if hasattr(frame, 'reduced') else frame
+    if img.ndim == 3:
+        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return cv2.resize(img, THUMB_SIZE, interpolation=cv2.INTER_AREA)
+
+
+def difference(a, b):
+    return float(np.mean(cv2.absdiff(a, b)))
+
+
+class MotionGate:
+    """Skips detection on frames where nothing changed.
+
+    The camera is static, so consecutive frames of a session are usually near
+    identical. Each frame's thumbnail is compared with the one detection last
+    ran on: below `still` the previous result (face or no face) is returned as
+    is; above `scene` the `on_scene_change` hook runs first (e.g.
+    FaceTracker.reset, forcing a full-frame pass); in between `detect` runs as
+    usual. `reused` tells whether the last update() skipped detection.
+    """
+
+    def __init__(self, detect, on_scene_change=None, still=STILL_DIFF, scene=SCENE_DIFF,
+                 max_reuse=MAX_REUSE):
+        self.detect = detect
+        self.on_scene_change = on_scene_change
+        self.still = still
+        self.scene = scene
+        self.max_reuse = max_reuse
+        self.ref = None        # thumbnail of the frame detection last ran on
+        self.last = None       # ... and its result
+        self.reused = False
+        self.run_count = 0
+        self.skip_count = 0
+        self.scene_changes = 0
+        self._streak = 0
+
+    def update(self, frame):
+        thumb = thumbnail(frame)
+        diff = None if self.ref is None else difference(thumb, self.ref)
+        if diff is not None and diff < self.still and self._streak < self.max_reuse:
+            self._streak += 1
+            self.skip_count += 1
+            self.reused = True
+            return self.last
+        if diff is not None and diff >= self.scene and self.on_scene_change is not None:
+            self.scene_changes += 1
+            self.on_scene_change()
+        self.ref = thumb
+        self.last = self.detect(frame)
+        self._streak = 0
+        self.run_count += 1
+        self.reused = False
+        return self.last
+
+    def reset(self):
+        self.ref = self.last = None
+        self._streak = 0
+
+    def stats(self):
+        return {'motion_skipped': self.skip_count, 'motion_detected': self.run_count,
+                'scene_changes': self.scene_changes}
@@ -1,7 +1,9 @@
 import os
 import paho.mqtt.client as mqtt
 import json
-import time
+import threading
+
+from job_scheduler import PRIORITY_USER
 
 class MQTTHandler:
     def __init__(self):
@@ -23,25 +25,35 @@ class MQTTHandler:
         self.mqtt_client.on_connect = self.on_connect
         self.mqtt_client.on_message = self.on_message
         self.mqtt_client.on_publish = self.on_publish
+        self.mqtt_client.on_disconnect = self.on_disconnect
 
         self.face_recognizer = None
         self.arduino = None
+        self.connected = threading.Event()
 
+        # Non-blocking: the network loop connects (and reconnects) in the
+        # background, and discovery is published from on_connect.
         print(f"Connecting to MQTT broker at {self.mqtt_broker}:{self.mqtt_port}")
-        self.mqtt_client.connect(self.mqtt_broker, self.mqtt_port, 60)
+        self.mqtt_client.connect_async(self.mqtt_broker, self.mqtt_port, 60)
         self.mqtt_client.loop_start()
 
-        # Wait for connection to be established
-        time.sleep(2)
-
-        # Broadcast device types after connection
-        self.broadcast_device_types()
-
     def on_connect(self, client, userdata, flags, rc):
         print(f"Connected with result code {rc}")
+        if rc != 0:
+            return
         client.subscribe(self.learn_face_command_topic + "/command")
         client.subscribe(self.unlock_door_command_topic + "/command")
         client.subscribe(self.recognize_face_command_topic + "/command")
+        # On every (re)connect, so HA sees the devices again after a broker restart.
+        self.broadcast_device_types()
+        self.connected.set()
+
+    def on_disconnect(self, client, userdata, rc):
+        print(f"Disconnected with result code {rc}")
+        self.connected.clear()
+
+    def wait_connected(self, timeout=None):
+        return self.connected.wait(timeout)
 
     def set_face_recognizer(self, face_recognizer):
         self.face_recognizer = face_recognizer
@@ -54,7 +66,9 @@ class MQTTHandler:
         if msg.topic == self.learn_face_command_topic + "/command":
             print("Received command to learn new face")
             if self.face_recognizer:
-                self.face_recognizer.learn_new_face()
+                # Queued on the recognizer's job worker: this is paho's network
+                # thread, which must not block (keepalives, other messages).
+                self.face_recognizer.request_learn()
             else:
                 print("Face recognizer not set")
         elif msg.topic == self.unlock_door_command_topic + "/command":
@@ -66,7 +80,7 @@ class MQTTHandler:
         elif msg.topic == self.recognize_face_command_topic + "/command":
             print("Received command to recognize face")
             if self.face_recognizer:
-                name = self.face_recognizer.captureFace()
+                self.face_recognizer.request_capture(priority=PRIORITY_USER)
             else:
                 print("Face recognizer not set")
 
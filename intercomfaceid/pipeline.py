@@ -0,0 +1,179 @@
+import logging
+import queue
+import threading
+import time
+
+
+class _StageStats:
+    __slots__ = ('n', 'busy_ms', 'wait_ms', 'depth_sum', 'depth_max', 'errors', 'batches')
+
+    def __init__(self):
+        self.n = 0
+        self.busy_ms = 0.0    # time spent inside the stage function
+        self.wait_ms = 0.0    # time items sat in the stage's input queue
+        self.depth_sum = 0    # input-queue depth sampled at every take
+        self.depth_max = 0
+        self.errors = 0
+        self.batches = 0      # calls of a batching stage (n / batches = avg batch)
+
+    def summary(self):
+        n = self.n or 1
+        return {
+            'n': self.n,
+            'avg_ms': round(self.busy_ms / n, 1) if self.n else None,
+            'wait_avg_ms': round(self.wait_ms / n, 1) if self.n else None,
+            'queue_avg': round(self.depth_sum / n, 2) if self.n else None,
+            'queue_max': self.depth_max,
+            'errors': self.errors,
+            'avg_batch': round(self.n / self.batches, 2) if self.batches else None,
+        }
+
+
+class Pipeline:
+    """Runs each stage of a per-frame job on its own thread, joined by bounded
+    queues, so stage 1 works on frame N+1 while stage 2 is still on frame N.
+
+    The first thread pulls items from `source()` (None = nothing yet) and runs
+    the first stage; every further stage has a thread of its own. Stage
+    functions take the item and return it (or None to drop it); an exception
+    drops the item and is logged. Finished items come out of get() in order.
+
+    A later stage given as (name, fn, batch) receives a LIST of up to `batch`
+    items — whatever is already queued when it becomes free, never waiting
+    for more — and returns the list. That lets a model run several frames in
+    one inference call exactly when it is the bottleneck. Its queue still
+    holds only `depth` items, so batches grow no larger than `depth` allows:
+    batching never lets an earlier stage run further ahead.
+
+    Queues between stages hold `depth` items and block when full, so a fast
+    stage never runs more than `depth` frames ahead of a slow one — it waits
+    and then picks up a fresh frame instead of piling up stale ones. The
+    native code in every stage (ONNX Runtime, OpenCV, NumPy) releases the
+    GIL, so the threads really do run on separate cores.
+    """
+
+    def __init__(self, source, stages, depth=1):
+        self.source = source
+        self.stages = [(st[0], st[1], st[2] if len(st) > 2 else 1) for st in stages]
+        self.depth = depth
+        self._stop = threading.Event()
+        self._queues = [queue.Queue(maxsize=depth) for _ in self.stages[1:]]
+        self._out = queue.Queue()
+        self._stats = {name: _StageStats() for name, _, _ in self.stages}
+        self._threads = []
+        self._latency_ms = 0.0                # source -> output, per item
+        self._latency_n = 0
+
+    def start(self):
+        for i in range(len(self.stages)):
+            t = threading.Thread(target=self._run, args=(i,), daemon=True,
+                                 name=f'pipeline-{self.stages[i][0]}')
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=5)
+        self._threads = []
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def get(self, timeout=None):
+        """Next finished item, or None on timeout."""
+        try:
+            item, t_src = self._out.get(timeout=timeout)
+        except queue.Empty:
+            return None
+        self._latency_ms += (time.time() - t_src) * 1000
+        self._latency_n += 1
+        return item
+
+    def _put(self, q, envelope):
+        while not self._stop.is_set():
+            try:
+                q.put(envelope, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def _drain(self, i, limit):
+        """Up to `limit` more (item, t_src) already waiting for stage i."""
+        q, out = self._queues[i - 1], []
+        st = self._stats[self.stages[i][0]]
+        while len(out) < limit:
+            try:
+                item, t_src, t_put = q.get_nowait()
+            except queue.Empty:
+                break
+            st.wait_ms += (time.time() - t_put) * 1000
+            out.append((item, t_src))
+        return out
+
+    def _take(self, i):
+        """(item, t_src) for stage i, or None if stopping."""
+        if i == 0:
+            while not self._stop.is_set():
+                item = self.source()
+                if item is not None:
+                    return item, time.time()
+            return None
+        q = self._queues[i - 1]
+        while not self._stop.is_set():
+            depth = q.qsize()
+            try:
+                item, t_src, t_put = q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            st = self._stats[self.stages[i][0]]
+            st.wait_ms += (time.time() - t_put) * 1000
+            st.depth_sum += depth
+            st.depth_max = max(st.depth_max, depth)
+            return item, t_src
+        return None
+
+    def _run(self, i):
+        name, fn, batch = self.stages[i]
+        st = self._stats[name]
+        last = i == len(self.stages) - 1
+        while True:
+            got = self._take(i)
+            if got is None:
+                return
+            if batch > 1:
+                envelopes = [got] + self._drain(i, batch - 1)
+                items = [e[0] for e in envelopes]
+            else:
+                envelopes, items = [got], got[0]
+            t0 = time.time()
+            try:
+                items = fn(items)
+            except Exception as e:
+                st.errors += 1
+                logging.error(f'{name} error: {e}')
+                items = None
+            st.busy_ms += (time.time() - t0) * 1000
+            st.n += len(envelopes)
+            if batch > 1:
+                st.batches += 1
+            if items is None:
+                continue
+            results = zip(items, (e[1] for e in envelopes)) if batch > 1 else [(items, got[1])]
+            for item, t_src in results:
+                if item is None:
+                    continue
+                if last:
+                    self._out.put((item, t_src))
+                else:
+                    self._put(self._queues[i], (item, t_src, time.time()))
+
+    def stats(self):
+        out = {name: self._stats[name].summary() for name, _, _ in self.stages}
+        out['latency_avg_ms'] = round(self._latency_ms / self._latency_n, 1) if self._latency_n else None
+        out['depth'] = self.depth
+        return out
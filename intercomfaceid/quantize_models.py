@@ -0,0 +1,135 @@
+"""Produce INT8 variants of the buffalo_sc models, offline, for
+model_loader (select them with the add-on's model_variant option).
+
+    python quantize_models.py dynamic
+    python quantize_models.py static [--calib /data/snapshots /data/face_snapshots] [--limit 200]
+
+dynamic: weights to int8, activations quantized on the fly — no data needed,
+    but SCRFD/ArcFace are convolutional, and ConvInteger is rarely faster than
+    fp32 Conv on ARM. Mostly a baseline.
+static: weights and activations to int8 (QDQ, per-channel weights), with
+    activation ranges calibrated on stored snapshots and the faces in them.
+    The variant to try on armv7 / aarch64.
+
+Compare a variant with fp32 on real data before switching: compare_models.py.
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+import tempfile
+
+import cv2
+import numpy as np
+from insightface.utils import face_align
+from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat,
+                                      QuantType, quantize_dynamic, quantize_static)
+
+import model_loader
+
+DET_SIZE = (320, 320)   # what FaceRecognizer runs SCRFD at; calibrate at the same size
+
+
+def calibration_images(dirs, limit):
+    """(path, image) of up to `limit` JPEGs from `dirs` (recursively), spread
+    evenly over them."""
+    paths = []
+    for d in dirs:
+        paths += glob.glob(os.path.join(d, '**', '*.jp*g'), recursive=True)
+    paths.sort()
+    if len(paths) > limit:
+        paths = [paths[i * len(paths) // limit] for i in range(limit)]
+    for p in paths:
+        img = cv2.imread(p)
+        if img is not None:
+            yield p, img
+
+
+def _det_blob(det, img):
+    """SCRFD.detect's preprocessing: letterbox into DET_SIZE, then normalise."""
+    h, w = img.shape[:2]
+    scale = min(DET_SIZE[0] / w, DET_SIZE[1] / h)
+    nw, nh = int(w * scale), int(h * scale)
+    canvas = np.zeros((DET_SIZE[1], DET_SIZE[0], 3), dtype=np.uint8)
+    canvas[:nh, :nw] = cv2.resize(img, (nw, nh))
+    return cv2.dnn.blobFromImage(canvas, 1.0 / det.input_std, DET_SIZE,
+                                 (det.input_mean,) * 3, swapRB=True)
+
+
+def _rec_blob(rec, crop):
+    return cv2.dnn.blobFromImages([crop], 1.0 / rec.input_std, rec.input_size,
+                                  (rec.input_mean,) * 3, swapRB=True)
+
+
+class _Blobs(CalibrationDataReader):
+    def __init__(self, input_name, blobs):
+        self._it = iter({input_name: b} for b in blobs)
+
+    def get_next(self):
+        return next(self._it, None)
+
+
+def _pre_process(src, tmp_dir):
+    """ORT's recommended shape inference + graph cleanup before quantizing
+    (onnxruntime >= 1.14); the source file as is on older versions."""
+    try:
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+    except ImportError:
+        return src
+    dst = os.path.join(tmp_dir, os.path.basename(src))
+    quant_pre_process(src, dst)
+    return dst
+
+
+def quantize(mode, calib_dirs=(), limit=200):
+    files = model_loader.model_files()
+    variant = f'int8_{mode}'
+    outputs = {role: model_loader.variant_path(src, variant) for role, src in files.items()}
+    os.makedirs(os.path.dirname(outputs['detection']), exist_ok=True)
+
+    if mode == 'dynamic':
+        for role, src in files.items():
+            # ConvInteger (what Conv becomes) only has uint8 x uint8 CPU kernels.
+            quantize_dynamic(src, outputs[role], weight_type=QuantType.QUInt8)
+            print(f'{role}: {outputs[role]}')
+        return outputs
+
+    # Static: collect calibration inputs with the fp32 models themselves —
+    # detector inputs from the snapshots, aligned faces for the recognizer.
+    det, rec, _ = model_loader.load_models(det_size=DET_SIZE, variant='fp32')
+    det_blobs, rec_blobs = [], []
+    for _, img in calibration_images(calib_dirs, limit):
+        det_blobs.append(_det_blob(det, img))
+        bboxes, kpss = det.detect(img, input_size=DET_SIZE, max_num=0, metric='default')
+        for kps in (kpss if kpss is not None else []):
+            rec_blobs.append(_rec_blob(rec, face_align.norm_crop(img, landmark=kps, image_size=112)))
+    print(f'Calibrating on {len(det_blobs)} images, {len(rec_blobs)} faces')
+    if not det_blobs or not rec_blobs:
+        sys.exit('Static quantization needs snapshots with faces in them (--calib).')
+
+    inputs = {'detection': (det.input_name, det_blobs), 'recognition': (rec.input_name, rec_blobs)}
+    with tempfile.TemporaryDirectory() as tmp:
+        for role, src in files.items():
+            name, blobs = inputs[role]
+            quantize_static(_pre_process(src, tmp), outputs[role], _Blobs(name, blobs),
+                            quant_format=QuantFormat.QDQ, per_channel=True,
+                            activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+                            calibrate_method=CalibrationMethod.MinMax)
+            print(f'{role}: {outputs[role]}')
+    return outputs
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(levelname)s %(message)s')
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument('mode', choices=('dynamic', 'static'))
+    ap.add_argument('--calib', nargs='+', default=['/data/snapshots', '/data/face_snapshots'],
+                    help='directories of JPEGs to calibrate static quantization on')
+    ap.add_argument('--limit', type=int, default=200, help='calibration images used at most')
+    args = ap.parse_args()
+    quantize(args.mode, args.calib, args.limit)
+
+
+if __name__ == '__main__':
+    main()
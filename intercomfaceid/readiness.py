@@ -0,0 +1,74 @@
+import logging
+import threading
+import time
+
+
+class Readiness:
+    """Start-up state of each subsystem — 'starting', then 'ready' or
+    'failed' — and how long after boot it got there. run() starts a
+    subsystem on its own thread, so the slow ones (model load, serial port,
+    MQTT broker) come up side by side; wait() blocks on one of them.
+    """
+
+    def __init__(self):
+        self.t0 = time.time()
+        self._lock = threading.Lock()
+        self._states = {}    # name -> {'state', 'after_s'[, 'error']}
+        self._events = {}    # name -> Event set once it's ready or failed
+
+    def _event(self, name):
+        with self._lock:
+            return self._events.setdefault(name, threading.Event())
+
+    def _set(self, name, state, **extra):
+        with self._lock:
+            self._states[name] = {'state': state, 'after_s': round(time.time() - self.t0, 2), **extra}
+
+    def starting(self, name):
+        self._event(name)
+        self._set(name, 'starting')
+
+    def ready(self, name):
+        self._set(name, 'ready')
+        logging.info(f"{name} ready {time.time() - self.t0:.1f}s after start-up")
+        self._event(name).set()
+
+    def failed(self, name, error):
+        self._set(name, 'failed', error=str(error))
+        logging.error(f"{name} failed to start: {error}")
+        self._event(name).set()
+
+    def run(self, name, fn):
+        """Run fn() on a daemon thread; the subsystem is ready when it returns."""
+        self.starting(name)
+
+        def target():
+            try:
+                fn()
+            except Exception as e:
+                self.failed(name, e)
+            else:
+                self.ready(name)
+
+        t = threading.Thread(target=target, name=f'start-{name}', daemon=True)
+        t.start()
+        return t
+
+    def is_ready(self, name):
+        with self._lock:
+            return self._states.get(name, {}).get('state') == 'ready'
+
+    def wait(self, name, timeout=None):
+        """Block until `name` is ready or failed; True only if ready."""
+        self._event(name).wait(timeout)
+        return self.is_ready(name)
+
+    def stats(self):
+        with self._lock:
+            states = {name: dict(s) for name, s in self._states.items()}
+        done = [s['after_s'] for s in states.values() if s['state'] != 'starting']
+        return {
+            'subsystems': states,
+            'all_ready': bool(states) and all(s['state'] == 'ready' for s in states.values()),
+            'boot_s': max(done) if done and len(done) == len(states) else None,
+        }
@@ -1,29 +1,157 @@
 import cv2
 import numpy as np
 import threading
+from contextlib import contextmanager
 import time
 import logging
-import requests
 from requests.exceptions import RequestException
-import queue
+from collections import deque
+
+from frame_sources import make_source
+from mjpeg_parser import jpeg_size
+
+
+class Frame:
+    """One JPEG as received from the stream. Decoding is deferred until a
+    consumer actually asks for the pixels, so frames that are dropped from the
+    ring (or only ever saved to disk) never cost a cv2.imdecode."""
+
+    __slots__ = ('jpeg', 'timestamp', 'seq', 'decodes', 'on_decode', '_image', '_reduced', '_size')
+
+    # libjpeg can decode straight to 1/2, 1/4, 1/8 scale by dropping DCT
+    # coefficients — far cheaper than a full decode followed by a resize.
+    _REDUCED_FLAGS = {2: cv2.IMREAD_REDUCED_COLOR_2,
+                      4: cv2.IMREAD_REDUCED_COLOR_4,
+                      8: cv2.IMREAD_REDUCED_COLOR_8}
+
+    def __init__(self, jpeg, timestamp, seq=0, on_decode=None):
+        self.jpeg = jpeg
+        self.timestamp = timestamp   # time.time() when the JPEG was received
+        self.seq = seq               # StreamManager's running frame number (0 = not from a stream)
+        self.decodes = 0             # cv2.imdecode calls made for this frame
+        self.on_decode = on_decode   # called as on_decode(frame, full) after each of them
+        self._image = None
+        self._reduced = {}
+        self._size = None
+
+    @property
+    def image(self):
+        """Full-resolution BGR ndarray (decoded once, then cached), or None if
+        the JPEG is corrupt. The attribute is read once and the decode returned
+        from a local: another thread may release() the same frame meanwhile."""
+        img = self._image
+        if img is None:
+            img = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+            self._image = img
+            self._decoded(True)
+        return img
+
+    def _decoded(self, full):
+        self.decodes += 1
+        if self.on_decode is not None:
+            self.on_decode(self, full)
+
+    @property
+    def decoded(self):
+        return self._image is not None
+
+    @property
+    def size(self):
+        """(width, height) of the full-resolution frame, read from the JPEG
+        header without decoding."""
+        if self._size is None:
+            self._size = jpeg_size(self.jpeg)
+            img = self.image if self._size is None else None
+            if img is not None:
+                self._size = (img.shape[1], img.shape[0])
+        return self._size
+
+    def scale_for(self, min_long_side):
+        """Largest DCT reduction (1, 2, 4 or 8) that still leaves the long side
+        at least min_long_side pixels — i.e. loses nothing for a consumer that
+        resizes down to min_long_side anyway."""
+        size = self.size
+        if size is None:
+            return 1
+        long_side = max(size)
+        for factor in (8, 4, 2):
+            if long_side // factor >= min_long_side:
+                return factor
+        return 1
+
+    def release(self):
+        """Drop the cached decodes (the JPEG stays). For frames that outlive
+        their use, e.g. in the pre-bell buffer — a 1080p decode is ~6 MB."""
+        self._image = None
+        self._reduced = {}
+
+    def reduced(self, factor):
+        """BGR ndarray decoded at 1/factor scale (cached per factor). Reuses the
+        full decode if one already exists."""
+        if factor == 1:
+            return self.image
+        img = self._reduced.get(factor)
+        if img is None:
+            full = self._image   # one read: release() may clear it under us
+            if full is not None:
+                h, w = full.shape[:2]
+                img = cv2.resize(full, ((w + factor - 1) // factor, (h + factor - 1) // factor),
+                                 interpolation=cv2.INTER_AREA)
+            else:
+                img = cv2.imdecode(np.frombuffer(self.jpeg, dtype=np.uint8), self._REDUCED_FLAGS[factor])
+                self._decoded(False)
+            self._reduced[factor] = img
+        return img
+
 
 class StreamManager:
-    def __init__(self, stream_url, max_retry_attempts=3, retry_delay=5, target_fps=7, autostart=True):
-        self.stream_url = stream_url
+    def __init__(self, source, max_retry_attempts=3, retry_delay=5, target_fps=7, autostart=True,
+                 linger_s=15, prebuffer_s=0, prebuffer_mb=32):
+        # An MJPEG URL, a V4L2 device / video file, a JPEG directory, or a
+        # FrameSource (see frame_sources.make_source).
+        self.source = make_source(source, fps=target_fps)
+        self.stream_url = str(self.source)
         self.current_frame = None
         self.last_frame_time = 0
         self.frame_count = 0
         self.is_capturing = False
         self.lock = threading.Lock()
+        # Signalled (under self.lock) whenever a frame is added or the stream
+        # stops, so consumers block in get_raw_frame / get_latest instead of polling.
+        self.frame_ready = threading.Condition(self.lock)
+        self.seq = 0               # seq of the newest frame received
         self.capture_thread = None
-        self.stream = None
         self.max_retry_attempts = max_retry_attempts
         self.retry_delay = retry_delay
         self.watchdog_thread = None
-        self.frame_queue = queue.Queue(maxsize=10)
+        # Ring of the newest compressed frames. The capture thread never decodes;
+        # the oldest frame silently falls off when a consumer is slower.
+        self.frames = deque(maxlen=10)
+        self.frames_received = 0   # frames that made it into the ring
+        self.frames_decoded = 0    # ... of which a consumer decoded (counted by Frame, see _on_decode)
+        self.full_decodes = 0      # full-resolution decodes, re-decodes after release() included
         self.target_fps = target_fps
         self.frame_interval = 1.0 / self.target_fps  # Time per frame (in seconds)
 
+        # Leases (see lease()): consumers ref-count the connection, which then
+        # stays up for linger_s after the last one leaves.
+        self.linger_s = linger_s
+        # Pre-bell buffer: with prebuffer_s > 0 the stream stays connected in the
+        # background and the last prebuffer_s seconds of JPEGs (never decoded,
+        # at most prebuffer_mb) are kept, so recognition can start from frames
+        # taken before the bell was even read. 1080p at 7 FPS is ~1.5 MB/s.
+        self.prebuffer_s = prebuffer_s
+        self.prebuffer_bytes = int(prebuffer_mb * 1024 * 1024)
+        self.history = deque()
+        self.history_bytes = 0
+        autostart = autostart or prebuffer_s > 0
+        self.keep_alive = autostart    # an always-on stream is never stopped by leases
+        self._lease_lock = threading.Lock()
+        self._leases = 0
+        self._linger_timer = None
+        self.connects = 0              # connections opened for a lease
+        self.connects_avoided = 0      # leases that found the stream already up
+
         # Start the stream immediately only if requested. On-demand mode
         # (autostart=False) leaves it stopped so the add-on burns no CPU
         # decoding frames while idle; captureFace/learn start it as needed.
@@ -36,9 +164,7 @@ class StreamManager:
             if not self.is_capturing:
                 for attempt in range(self.max_retry_attempts):
                     try:
-                        self.stream = requests.get(self.stream_url, stream=True, timeout=10)
-                        if self.stream.status_code != 200:
-                            raise Exception(f"Failed to connect to stream. Status code: {self.stream.status_code}")
+                        self.source.open()
 
                         # CRITICAL: discard any frames left over from a previous
                         # capture session. In on-demand mode the stream is stopped
@@ -53,7 +179,7 @@ class StreamManager:
                         self.capture_thread.daemon = True
                         self.is_capturing = True
                         self.capture_thread.start()
-                        logging.info(f"MJPEG stream capture started successfully. URL: {self.stream_url}")
+                        logging.info(f"Stream capture started successfully. Source: {self.stream_url}")
                         return True
                     except RequestException as e:
                         logging.error(f"Network error when starting video stream (attempt {attempt+1}/{self.max_retry_attempts}): {str(e)}")
@@ -73,49 +199,35 @@ class StreamManager:
                 return True
 
     def _capture_stream(self):
-        bytes_buffer = bytes()
         frame_counter = 0
         start_time = time.time()  # Record the start time for frame rate calculation
+        last_kept = 0.0
 
         while self.is_capturing:
             try:
-                chunk = self.stream.raw.read(16384)
-                if not chunk:
-                    raise Exception("No data received from stream.")
-                bytes_buffer += chunk
-
-                # Search for JPEG boundaries
-                while True:
-                    a = bytes_buffer.find(b'\xff\xd8')
-                    b = bytes_buffer.find(b'\xff\xd9')
-                    if a != -1 and b != -1:
-                        jpg = bytes_buffer[a:b + 2]
-                        bytes_buffer = bytes_buffer[b + 2:]  # Keep any remaining bytes
-                        frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR)
-
-                        if frame is not None:
-                            with self.lock:
-                                self.current_frame = frame
-                                self.last_frame_time = time.time()
-                                self.frame_count += 1
-                                frame_counter += 1  # Increment the frame counter
-                                try:
-                                    # Attempt to put the frame in the queue
-                                    self.frame_queue.put(frame, block=False)
-                                except queue.Full:
-                                    try:
-                                        self.frame_queue.get_nowait()  # Remove the oldest frame
-                                        self.frame_queue.put(frame, block=False)  # Add the new frame
-                                    except queue.Empty:
-                                        pass  # This should not happen as we're managing the size
-                            
-                            # Sleep to limit processing to 7 FPS
-                            time.sleep(self.frame_interval)
-
-                        break  # Exit the while loop to start capturing the next frame
-                    else:
-                        # Break out if we don't have a full frame yet
-                        break
+                # Every complete JPEG the source has comes back at once. The
+                # frame rate is limited by DROPPING frames rather than sleeping:
+                # a sleep stops us draining the socket/device, so frames back up
+                # in buffers and arrive seconds stale.
+                for jpg in self.source.read():
+                    now = time.time()
+                    # 10% slack: a source paced at exactly target_fps (file or
+                    # directory replay) must not lose frames to timer jitter.
+                    if now - last_kept < self.frame_interval * 0.9:
+                        continue
+                    last_kept = now
+                    with self.lock:
+                        self.seq += 1
+                        frame = Frame(jpg, now, self.seq, self._on_decode)
+                        self.current_frame = frame
+                        self.last_frame_time = now
+                        self.frame_count += 1
+                        self.frames_received += 1
+                        frame_counter += 1  # Increment the frame counter
+                        self.frames.append(frame)  # deque(maxlen) drops the oldest
+                        if self.prebuffer_s:
+                            self._remember(frame)
+                        self.frame_ready.notify_all()
 
                 # Log frame rate every 5 seconds
                 # current_time = time.time()
@@ -127,29 +239,163 @@ class StreamManager:
 
             except Exception as e:
                 logging.error(f"Error in stream capture: {str(e)}")
-                # Only restart if the error is severe (not a queue.Full error)
-                if not isinstance(e, queue.Full):
-                    self.restart_stream()  # Attempt to restart on error
+                self.restart_stream()  # Attempt to restart on error
                 time.sleep(0.1)  # Wait a bit before trying again
 
-        if self.stream:
-            self.stream.close()
-        logging.info("MJPEG stream capture stopped.")
+        self.source.close()
+        logging.info("Stream capture stopped.")
+
+    @contextmanager
+    def lease(self):
+        """Hold the stream open for the duration of a with-block:
+
+            with stream.lease() as ok:
+                if ok: ...
+
+        The first lease connects; later ones (and any lease taken while the
+        stream is still lingering after the last release) reuse the
+        connection. When the last lease ends the stream is stopped after
+        linger_s, unless someone leases it again first."""
+        ok = self._acquire()
+        try:
+            yield ok
+        finally:
+            if ok:
+                self._release()
+
+    def _acquire(self):
+        with self._lease_lock:
+            if self._linger_timer is not None:
+                self._linger_timer.cancel()
+                self._linger_timer = None
+            if self.is_capturing:
+                self.connects_avoided += 1
+                if self._leases == 0 and not self.keep_alive:
+                    # Lingering, nobody reading: what's in the ring predates
+                    # this lease. Same rule as a fresh connect — never hand
+                    # a new session frames from before it started.
+                    with self.lock:
+                        self._drain_queue()
+            elif self.start_video_stream():
+                self.connects += 1
+            else:
+                return False
+            self._leases += 1
+            return True
+
+    def _release(self):
+        with self._lease_lock:
+            self._leases -= 1
+            if self._leases > 0 or self.keep_alive:
+                return
+            if self.linger_s > 0:
+                self._linger_timer = threading.Timer(self.linger_s, self._linger_expired)
+                self._linger_timer.daemon = True
+                self._linger_timer.start()
+            else:
+                self.stop_video_stream()
+
+    def _linger_expired(self):
+        with self._lease_lock:
+            if self._leases == 0 and self._linger_timer is not None:
+                self._linger_timer = None
+                logging.info(f"No stream consumers for {self.linger_s}s, disconnecting.")
+                self.stop_video_stream()
+
+    def _remember(self, frame):
+        """Add to the pre-bell history, evicting by age and byte budget (lock held).
+        The history keeps its own Frame around the same JPEG bytes, so whatever a
+        live consumer decodes from `frame` is never pinned here."""
+        self.history.append(Frame(frame.jpeg, frame.timestamp, frame.seq))
+        self.history_bytes += len(frame.jpeg)
+        oldest = frame.timestamp - self.prebuffer_s
+        while self.history and (self.history[0].timestamp < oldest
+                                or self.history_bytes > self.prebuffer_bytes):
+            self.history_bytes -= len(self.history.popleft().jpeg)
+
+    def get_history(self, max_age=None):
+        """Buffered pre-bell Frames, NEWEST first, no older than max_age seconds
+        (default prebuffer_s). Empty unless the pre-bell buffer is enabled. Each
+        is a fresh, undecoded Frame: the buffer itself only ever holds JPEG bytes,
+        whatever the caller decodes."""
+        max_age = self.prebuffer_s if max_age is None else max_age
+        cutoff = time.time() - max_age
+        with self.lock:
+            return [Frame(f.jpeg, f.timestamp, f.seq, self._on_decode)
+                    for f in reversed(self.history) if f.timestamp >= cutoff]
+
+    def _on_decode(self, frame, full):
+        # Called from whichever consumer thread decodes; a lost increment
+        # between racing threads is harmless for a statistic.
+        if frame.decodes == 1:
+            self.frames_decoded += 1
+        if full:
+            self.full_decodes += 1
 
     def _drain_queue(self):
-        """Empty the frame queue so no stale frames survive across sessions."""
+        """Empty the frame ring so no stale frames survive across sessions."""
+        self.frames.clear()
+
+    def get_raw_frame(self, newest=False, timeout=0):
+        """Take the next compressed Frame without decoding it. newest=True skips
+        straight to the most recent frame and discards the backlog (never
+        decoded). With a timeout, blocks until a frame arrives (woken by the
+        capture thread, no polling). Returns (True, Frame) or (False, None)."""
+        with self.lock:
+            if not self.frames and timeout:
+                self.frame_ready.wait_for(lambda: self.frames, timeout)
+            if not self.frames:
+                return False, None
+            if newest:
+                frame = self.frames.pop()
+                self.frames.clear()
+            else:
+                frame = self.frames.popleft()
+        return True, frame
+
+    def get_frame(self, newest=False, timeout=0):
+        """Take the next frame and decode it, waiting up to `timeout` seconds
+        for one. Returns (True, ndarray) or (False, None). Corrupt JPEGs are
+        skipped."""
+        deadline = time.monotonic() + timeout
         while True:
-            try:
-                self.frame_queue.get_nowait()
-            except queue.Empty:
-                break
+            ret, frame = self.get_raw_frame(newest=newest, timeout=max(0.0, deadline - time.monotonic()))
+            if not ret:
+                return False, None
+            image = frame.image
+            if image is not None:
+                return True, image
+            logging.debug("Skipping undecodable frame.")
 
-    def get_frame(self):
-        try:
-            frame = self.frame_queue.get_nowait()
-            return True, frame
-        except queue.Empty:
-            return False, None
+    def get_latest(self, newer_than=0, timeout=None):
+        """The newest Frame with seq > newer_than, WITHOUT taking it from the
+        ring — other consumers still see it. Blocks until one arrives or
+        `timeout` seconds pass (None = wait forever). Returns (True, Frame) or
+        (False, None)."""
+        with self.lock:
+            def fresh():
+                return self.current_frame is not None and self.current_frame.seq > newer_than
+            if not fresh():
+                self.frame_ready.wait_for(fresh, timeout)
+            if not fresh():
+                return False, None
+            return True, self.current_frame
+
+    def stats(self):
+        received = self.frames_received
+        return {
+            'frames_received': received,
+            'frames_decoded': self.frames_decoded,
+            'full_decodes': self.full_decodes,
+            'decode_skipped_pct': round(100 * (received - self.frames_decoded) / received, 1) if received else None,
+            **self.source.stats(),
+            'leases': self._leases,
+            'connects': self.connects,
+            'connects_avoided': self.connects_avoided,
+            'linger_s': self.linger_s,
+            'prebuffer_frames': len(self.history),
+            'prebuffer_mb': round(self.history_bytes / 2**20, 1),
+        }
 
     def restart_stream(self):
         logging.info("Attempting to restart the video stream...")
@@ -165,11 +411,13 @@ class StreamManager:
                 if self.capture_thread.is_alive():
                     logging.warning("Capture thread did not terminate gracefully.")
                 self.capture_thread = None
-            if self.stream:
-                self.stream.close()
+            self.source.close()
             self.current_frame = None
             self._drain_queue()  # don't let this session's frames leak into the next
-            logging.info("MJPEG stream capture stopped.")
+            self.history.clear()
+            self.history_bytes = 0
+            self.frame_ready.notify_all()
+            logging.info("Stream capture stopped.")
 
     def start_watchdog(self):
         self.watchdog_thread = threading.Thread(target=self._watchdog)
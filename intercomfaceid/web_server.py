@@ -7,14 +7,19 @@ from fastapi import FastAPI, Body
 from fastapi.responses import HTMLResponse, JSONResponse, FileResponse
 import uvicorn
 
+from job_scheduler import PRIORITY_USER
+
 app = FastAPI()
 
 _event_logger = None
 _face_recognizer = None
 _blur_calibration = None
+_scheduler = None
+_readiness = None
 
 SNAPSHOTS_DIR = '/data/snapshots'
 FACE_SNAPSHOTS_DIR = '/data/face_snapshots'
+BENCHMARK_WAIT_S = 90   # a queued benchmark may first wait for a bell session (~30 s)
 
 HTML = """<!DOCTYPE html>
 <html lang="en">
@@ -315,13 +320,18 @@ const BADGE = {
   serial_command:       ['b-raw',   '📡 Serial'],
   arduino_connected:    ['b-ard',   '🔌 Connected'],
   arduino_disconnected: ['b-ard',   '⚠️ Disconnected'],
+  job:                  ['b-raw',   '🗂 Job'],
+  models_loaded:        ['b-raw',   '🧠 Models'],
+  model_warmup:         ['b-raw',   '🔥 Warm-up'],
 };
 const ICON = {
   bell_ring: '🔔', hex_received: '📶', recognition_started: '🔍',
   face_recognized: '👤', face_denied: '❓', face_migrated: '⚡',
   door_unlocked: '🔓', serial_command: '📡',
-  arduino_connected: '🔌', arduino_disconnected: '⚠️'
+  arduino_connected: '🔌', arduino_disconnected: '⚠️', job: '🗂', models_loaded: '🧠', model_warmup: '🔥'
 };
+// Routine job transitions are only in api/jobs; the feed shows the unusual ones.
+const QUIET_JOB_STATES = ['queued', 'running', 'done'];
 
 function evHtml(e) {
   const [bcls, blbl] = BADGE[e.type] || ['b-raw', e.type];
@@ -333,9 +343,12 @@ function evHtml(e) {
     if (e.detect_frames)  parts.push(`🔍 detect ${e.detect_avg_ms}ms × ${e.detect_frames}f`);
     if (e.embed_frames)   parts.push(`🧠 embed ${e.embed_avg_ms}ms × ${e.embed_frames}f`);
     if (e.forced_processed) parts.push(`🎯 ${e.forced_processed} forced`);
+    if (e.explored_processed) parts.push(`🎲 ${e.explored_processed} explored`);
     if (e.skipped_blurry)   parts.push(`🌫 ${e.skipped_blurry} skipped`);
     if (e.no_face_frames)   parts.push(`👻 ${e.no_face_frames} no-face`);
+    if (e.cached)         parts.push(`⚡ standby identity, ${e.cache_age_s}s old`);
     if (e.duration_s)     parts.push(`${e.duration_s}s`);
+    if (e.end_reason && e.end_reason !== 'match' && e.end_reason !== 'cached') parts.push(`⏹ ${e.end_reason}${e.watch_reason ? ` (watch after ${e.watch_from_s}s: ${e.watch_reason})` : ''}`);
     return parts.length
       ? `<div style="font-size:11px;color:var(--muted);margin-top:3px">${parts.join(' &nbsp;·&nbsp; ')}</div>`
       : '';
@@ -355,6 +368,15 @@ function evHtml(e) {
     detail = `<div class="ev-detail">Door opened</div>`;
   else if (e.type === 'serial_command')
     detail = `<div class="ev-detail">${e.command||''}</div>`;
+  else if (e.type === 'models_loaded')
+    detail = `<div class="ev-detail">Ready in ${e.total_ms}ms</div>` + ['detection', 'recognition'].filter(r => e[r]).map(r =>
+      `<div style="font-size:11px;color:var(--muted);margin-top:3px">${r}: load ${e[r].load_ms}ms${e[r].cached ? ' (cached graph)' : ''} · first inference ${e[r].first_inference_ms}ms · ${e[r].threads} threads</div>`).join('');
+  else if (e.type === 'model_warmup')
+    detail = `<div class="ev-detail">${e.source} ${e.resolution}${e.face_found ? ' (face found)' : ''}</div>` +
+      `<div style="font-size:11px;color:var(--muted);margin-top:3px">${Object.keys(e.cold || {}).map(k =>
+        `${k.replace('_ms', '')} ${e.cold[k]} → ${(e.warm || {})[k]}ms`).join(' &nbsp;·&nbsp; ')}</div>`;
+  else if (e.type === 'job')
+    detail = `<div class="ev-detail">${e.kind} #${e.job_id} ${e.state}${e.coalesced ? ` (×${e.coalesced + 1})` : ''}${e.error ? ' — ' + e.error : ''}</div>`;
   else if (e.message)
     detail = `<div class="ev-detail">${e.message}</div>`;
   return `<div class="ev">${thumb}<div class="ev-body"><div class="ev-row"><span class="badge ${bcls}">${blbl}</span><span class="ev-time">${fmt(e.timestamp)}</span></div>${detail}</div></div>`;
@@ -363,7 +385,7 @@ function evHtml(e) {
 async function loadEvents() {
   try {
     const r = await fetch('api/events');
-    const events = await r.json();
+    const events = (await r.json()).filter(e => e.type !== 'job' || !QUIET_JOB_STATES.includes(e.state));
     const el = document.getElementById('events-list');
     el.innerHTML = events.length ? events.map(evHtml).join('') : '<div class="empty">No events yet.</div>';
   } catch(err) { console.error(err); }
@@ -412,10 +434,20 @@ function renderBench(d) {
     ${d.frames} frames · ${d.resolution} · ${d.faces_detected} had a real face
     <br>embedding is forced on a synthetic crop when no face is present, so timing is consistent</div>
     <table class="bench-table">`;
+  h += benchRow('decode full-res JPEG', d.decode_full_ms);
+  h += benchRow(`decode ${d.detect_scale || '1/1'} (detect input)`, d.decode_reduced_ms);
   h += benchRow('detect (SCRFD)', d.detect_ms);
   h += benchRow('embed (ArcFace)', d.embed_ms);
   h += benchRow('TOTAL per frame', d.total_ms, true);
   h += '</table>';
+  if (d.embed_batch) {
+    h += `<table class="bench-table" style="margin-top:10px">
+      <tr><td style="color:var(--muted)">ArcFace batch</td><td>per call</td><td>per face</td><td>faces/s</td></tr>`;
+    for (const [n, b] of Object.entries(d.embed_batch)) {
+      h += `<tr><td style="color:var(--muted)">${n}</td><td>${b.ms} ms</td><td>${b.per_face_ms} ms</td><td>${b.faces_per_s}</td></tr>`;
+    }
+    h += '</table>';
+  }
   return h;
 }
 
@@ -756,6 +788,22 @@ async def rename_face(name: str, body: dict = Body(...)):
     return _face_recognizer.rename_face(name, (body or {}).get('new_name', ''))
 
 
+@app.get("/api/faces/index")
+def get_face_index():
+    # sync def: measuring IVF recall runs a few hundred searches.
+    if _face_recognizer is None:
+        return {}
+    return _face_recognizer.index_stats()
+
+
+@app.get("/api/stream")
+async def get_stream_stats():
+    # Frames parsed / decoded, plus connects made vs avoided by lease linger.
+    if _face_recognizer is None:
+        return {}
+    return _face_recognizer.stream_manager.stats()
+
+
 @app.get("/api/calibration")
 async def get_calibration():
     if _blur_calibration is None:
@@ -769,7 +817,46 @@ def run_benchmark():
     # benchmark doesn't stall the event loop / other requests.
     if _face_recognizer is None:
         return {'error': 'no recognizer'}
-    return _face_recognizer.benchmark()
+    if _scheduler is None:
+        return _face_recognizer.benchmark()
+    # Through the job queue, so it never fights a bell session for the camera.
+    job = _face_recognizer.request_benchmark(priority=PRIORITY_USER)
+    if not job.wait(timeout=BENCHMARK_WAIT_S):
+        return {'error': f'benchmark still {job.state} after {BENCHMARK_WAIT_S}s'}
+    if job.state != 'done':
+        return {'error': job.error or f'benchmark {job.state}'}
+    return job.result
+
+
+@app.get("/api/status")
+async def get_status():
+    # Which subsystems are up yet, and how long after boot each took.
+    if _readiness is None:
+        return {}
+    return _readiness.stats()
+
+
+@app.get("/api/models")
+async def get_models():
+    # Session load / first-inference times and whether the ORT cache was hit.
+    if _face_recognizer is None:
+        return {}
+    return _face_recognizer.model_report or {}
+
+
+@app.get("/api/jobs")
+async def get_jobs():
+    if _scheduler is None:
+        return {}
+    return _scheduler.stats()
+
+
+@app.post("/api/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int):
+    job = _scheduler.get(job_id) if _scheduler is not None else None
+    if job is None:
+        return JSONResponse({'success': False, 'error': 'no such job'}, status_code=404)
+    return {'success': _scheduler.cancel(job), 'state': job.state}
 
 
 @app.get("/snapshots/{filename}")
@@ -792,18 +879,23 @@ async def get_face_snapshot(subpath: str):
     return JSONResponse({'error': 'not found'}, status_code=404)
 
 
-def start(event_logger, face_recognizer, port=8099, blur_calibration=None):
-    global _event_logger, _face_recognizer, _blur_calibration
+def start(event_logger, face_recognizer, port=8099, blur_calibration=None, scheduler=None,
+          readiness=None):
+    global _event_logger, _face_recognizer, _blur_calibration, _scheduler, _readiness
     _event_logger = event_logger
     _face_recognizer = face_recognizer
     _blur_calibration = blur_calibration
+    _scheduler = scheduler
+    _readiness = readiness
     logging.info(f"Starting web server on port {port}")
     uvicorn.run(app, host='0.0.0.0', port=port, log_level='warning')
 
 
-def start_in_thread(event_logger, face_recognizer, port=8099, blur_calibration=None):
+def start_in_thread(event_logger, face_recognizer, port=8099, blur_calibration=None, scheduler=None,
+                    readiness=None):
     t = threading.Thread(target=start,
-                         args=(event_logger, face_recognizer, port, blur_calibration),
+                         args=(event_logger, face_recognizer, port, blur_calibration, scheduler,
+                               readiness),
                          daemon=True)
     t.start()
     return t